@@ -0,0 +1,293 @@
+"""Inverted-file (IVF) approximate nearest-neighbour index over the sound features.
+
+Usage: python ann.py [--lists 25] [--pq 2] [--nprobe 1 2 4 8]
+
+Builds the index over the loaded catalog, reports recall@k against exact
+search for each nprobe, and saves it where ``model.recommend_songs`` picks it up.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+from instrumentation import record_cache, timed
+from loading import CACHE_DIR, dataset_version, on_dataset_evicted
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Saved index, picked up by model.recommend_songs when it matches the loaded dataset
+ANN_PATH = os.path.join(CACHE_DIR, "ivf.npz")
+
+# Inverted lists scanned per query by default
+DEFAULT_NPROBE = 4
+
+# Product-quantizer codes per subspace (fits in uint8)
+PQ_CODEBOOK_SIZE = 256
+
+# Residuals sampled to train the product quantizer
+PQ_TRAIN_SAMPLE = 100_000
+
+# With PQ, approximate candidates per result re-ranked with exact distances
+RERANK_FACTOR = 4
+
+# Rows encoded per block, bounding encoder memory
+ENCODE_BLOCK_SIZE = 65536
+
+# Loaded index for the current dataset, keyed by (version, path, mtime, song index)
+_ivf = {}
+_ivf_lock = threading.Lock()
+
+# Inverted-file index with optional product-quantized residuals
+class IVFIndex:
+    """Tracks bucketed by their nearest coarse centroid; queries scan only the ``nprobe`` closest buckets.
+
+    Distances are in the same space as ``model.SongIndex``, whose matrix the index
+    reads for exact scoring. With PQ, each track's residual to its centroid is also
+    stored as ``subspaces`` uint8 codes: buckets are ranked by table lookups and only
+    a short list is re-scored exactly.
+    """
+
+    def __init__(self, song_index, centroids, order, offsets, codebooks=None, codes=None, version=None):
+        self.song_index = song_index
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.order = order
+        self.offsets = offsets
+        self.codebooks = codebooks
+        self.codes = codes
+        self.version = version
+
+    @classmethod
+    @timed("ann.IVFIndex.build")
+    def build(cls, song_index, centroids, pq_subspaces=None, version=None, random_state=42):
+        matrix = song_index.matrix
+        centroids = np.asarray(centroids, dtype=np.float32)
+        assignments = cls._assign(matrix, centroids)
+
+        # Slots grouped by bucket, CSR-style
+        order = np.argsort(assignments, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1)).astype(np.int64)
+
+        codebooks = codes = None
+        if pq_subspaces:
+            if matrix.shape[1] % pq_subspaces:
+                raise ValueError(f"{matrix.shape[1]} features cannot be split into {pq_subspaces} subspaces.")
+            residuals = matrix[order] - centroids[assignments[order]]
+            codebooks = cls._train_pq(residuals, pq_subspaces, random_state)
+            codes = cls._encode(residuals, codebooks)
+
+        index = cls(song_index, centroids, order, offsets, codebooks, codes, version)
+        logging.info(f"✅ IVF index built: {len(centroids)} lists over {len(order)} tracks"
+                     + (f", PQ {pq_subspaces}x{codebooks.shape[1]}." if codebooks is not None else "."))
+        return index
+
+    @staticmethod
+    def _assign(matrix, centroids):
+        assignments = np.empty(len(matrix), dtype=np.int32)
+        for start in range(0, len(matrix), ENCODE_BLOCK_SIZE):
+            block = matrix[start:start + ENCODE_BLOCK_SIZE]
+            dist = ((block[:, np.newaxis, :] - centroids[np.newaxis, :, :]) ** 2).sum(axis=2)
+            assignments[start:start + len(block)] = dist.argmin(axis=1)
+        return assignments
+
+    @staticmethod
+    def _train_pq(residuals, subspaces, random_state):
+        from sklearn.cluster import MiniBatchKMeans
+
+        rng = np.random.default_rng(random_state)
+        sample = residuals[rng.choice(len(residuals), min(len(residuals), PQ_TRAIN_SAMPLE), replace=False)]
+        width = residuals.shape[1] // subspaces
+        size = min(PQ_CODEBOOK_SIZE, len(sample))
+        codebooks = np.empty((subspaces, size, width), dtype=np.float32)
+        for j in range(subspaces):
+            kmeans = MiniBatchKMeans(n_clusters=size, batch_size=4096, n_init=1, random_state=random_state)
+            codebooks[j] = kmeans.fit(sample[:, j * width:(j + 1) * width]).cluster_centers_
+        return codebooks
+
+    @staticmethod
+    def _encode(residuals, codebooks):
+        subspaces, _, width = codebooks.shape
+        codes = np.empty((len(residuals), subspaces), dtype=np.uint8)
+        for start in range(0, len(residuals), ENCODE_BLOCK_SIZE):
+            block = residuals[start:start + ENCODE_BLOCK_SIZE]
+            for j in range(subspaces):
+                part = block[:, j * width:(j + 1) * width]
+                dist = ((part[:, np.newaxis, :] - codebooks[j][np.newaxis, :, :]) ** 2).sum(axis=2)
+                codes[start:start + len(block), j] = dist.argmin(axis=1)
+        return codes
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def memory_bytes(self):
+        """Bytes held by the index itself, excluding the shared feature matrix."""
+        arrays = [self.centroids, self.order, self.offsets, self.codebooks, self.codes]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def _probe(self, point, nprobe):
+        dist = ((self.centroids - point) ** 2).sum(axis=1)
+        lists = np.argsort(dist)[:nprobe]
+        return lists, np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+
+    def search(self, point, k=10, nprobe=DEFAULT_NPROBE, exclude=None):
+        """Approximate ``(distances, slots)`` of the k tracks closest to ``point``, nearest first."""
+        lists, members = self._probe(point, nprobe)
+        slots = self.order[members]
+        if exclude is not None:
+            keep = slots != exclude
+            members, slots = members[keep], slots[keep]
+        if len(slots) == 0:
+            return np.array([], dtype=np.float32), np.array([], dtype=np.int64)
+
+        if self.codes is not None and len(slots) > RERANK_FACTOR * k:
+            # Asymmetric distance: query residual per bucket against every codeword, then table lookups
+            subspaces, _, width = self.codebooks.shape
+            bucket = np.repeat(np.arange(len(lists)), np.diff(self.offsets)[lists])
+            if exclude is not None:
+                bucket = bucket[keep]
+            residuals = (point - self.centroids[lists]).reshape(len(lists), subspaces, 1, width)
+            tables = ((residuals - self.codebooks[np.newaxis]) ** 2).sum(axis=3)
+            approx = np.zeros(len(slots), dtype=np.float32)
+            for j in range(subspaces):
+                approx += tables[bucket, j, self.codes[members, j]]
+            shortlist = np.argpartition(approx, RERANK_FACTOR * k - 1)[:RERANK_FACTOR * k]
+            slots = slots[shortlist]
+
+        dist = np.sqrt(((self.song_index.matrix[slots] - point) ** 2).sum(axis=1))
+        top = np.argsort(dist, kind="stable")[:k]
+        return dist[top], slots[top].astype(np.int64)
+
+    @timed("ann.IVFIndex.query")
+    def query(self, position, k=10, nprobe=DEFAULT_NPROBE):
+        """Same contract as ``SongIndex.query`` without filters: ``(positions, distances, scores)``."""
+        index = self.song_index
+        slot = index.slots[position]
+        if slot < 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32), np.array([], dtype=np.float32)
+        dist, slots = self.search(index.matrix[slot], k, nprobe, exclude=slot)
+        return index.rows[slots], dist, (1.0 - dist / index.max_distance).astype(np.float32)
+
+    def save(self, path=ANN_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {"centroids": self.centroids, "order": self.order, "offsets": self.offsets,
+                  "version": np.array(self.version or "")}
+        if self.codes is not None:
+            arrays.update(codebooks=self.codebooks, codes=self.codes)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        logging.info(f"✅ IVF index saved to {path}.")
+
+    @classmethod
+    def load(cls, path, song_index):
+        with np.load(path) as saved:
+            if len(saved["order"]) != len(song_index):
+                raise ValueError(f"{path} indexes {len(saved['order'])} tracks, not {len(song_index)}.")
+            return cls(song_index, saved["centroids"], saved["order"], saved["offsets"],
+                       saved["codebooks"] if "codebooks" in saved.files else None,
+                       saved["codes"] if "codes" in saved.files else None, str(saved["version"]))
+
+# IVF index over a catalog, reusing the song clustering's centroids as coarse buckets when it has that k
+def build_ivf_index(data, n_lists=25, pq_subspaces=None):
+    from sklearn.cluster import MiniBatchKMeans
+    from clustering import SONG_CLUSTER_RANGE, get_cluster_sweep
+    from model import get_song_index
+
+    song_index = get_song_index(data)
+    if n_lists in SONG_CLUSTER_RANGE:
+        centroids = get_cluster_sweep(data, SONG_CLUSTER_RANGE, "songs").result(n_lists)["centroids"]
+    else:
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=1, random_state=42)
+        centroids = kmeans.fit(song_index.matrix).cluster_centers_
+    return IVFIndex.build(song_index, centroids, pq_subspaces, version=dataset_version(data))
+
+# Saved IVF index for a dataset, or None when missing or built for another version
+def load_ivf_index(data, path=ANN_PATH):
+    if not os.path.exists(path):
+        return None
+    from model import get_song_index
+
+    song_index = get_song_index(data)
+    key = (dataset_version(data), path, os.path.getmtime(path), id(song_index))
+    with _ivf_lock:
+        record_cache("ivf_index", key in _ivf)
+        if key in _ivf:
+            return _ivf[key]
+        ivf = None
+        try:
+            ivf = IVFIndex.load(path, song_index)
+            if ivf.version == key[0]:
+                logging.info(f"✅ Serving approximate recommendations from {path}.")
+            else:
+                logging.info(f"Ignoring {path}: built for another dataset version.")
+                ivf = None
+        except Exception as e:
+            logging.warning(f"⚠️ Could not read IVF index {path}: {e}")
+        _ivf.clear()
+        _ivf[key] = ivf
+        return ivf
+
+# Drop the IVF index of a frame the dataset store let go of
+@on_dataset_evicted
+def _release_ivf_index(name, data):
+    version = dataset_version(data)
+    with _ivf_lock:
+        for key in [key for key in _ivf if key[0] == version]:
+            del _ivf[key]
+
+# Recall@k of the IVF index against an exact scan, with per-query latency, for each nprobe
+def evaluate_recall(ivf, k=10, nprobes=(1, 2, 4, 8), queries=200, random_state=42):
+    song_index = ivf.song_index
+    rng = np.random.default_rng(random_state)
+    slots = rng.choice(len(song_index), min(queries, len(song_index)), replace=False)
+    # A full scan rather than the KD-tree, so evaluating does not build the exact index
+    found = song_index.scan(song_index.matrix[slots], k + 1)[1]
+    exact = [set(song_index.rows[row[row != slot][:k]].tolist()) for slot, row in zip(slots, found)]
+
+    rows = []
+    for nprobe in nprobes:
+        hits, started = 0, time.perf_counter()
+        for slot, truth in zip(slots, exact):
+            hits += len(truth & set(ivf.query(song_index.rows[slot], k=k, nprobe=nprobe)[0].tolist()))
+        elapsed = time.perf_counter() - started
+        scanned = sum(len(ivf._probe(song_index.matrix[slot], nprobe)[1]) for slot in slots)
+        rows.append({
+            "nprobe": nprobe,
+            f"recall@{k}": hits / max(sum(len(truth) for truth in exact), 1),
+            "ms_per_query": 1000 * elapsed / len(slots),
+            "scanned_share": scanned / (len(slots) * max(len(ivf), 1)),
+        })
+    return pd.DataFrame(rows)
+
+def main():
+    from loading import import_data
+
+    parser = argparse.ArgumentParser(description="Build and evaluate the IVF index for MuzikiRec.")
+    parser.add_argument("--lists", type=int, default=25, help="coarse buckets (5-30 reuse the song clusters)")
+    parser.add_argument("--pq", type=int, default=0, help="PQ subspaces for residual codes (0 = exact scoring)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8], help="nprobe values to evaluate")
+    parser.add_argument("-k", type=int, default=10, help="neighbours per query for recall")
+    parser.add_argument("--output", default=ANN_PATH, help="output .npz path")
+    args = parser.parse_args()
+
+    data = import_data()[0]
+    if data is None or data.empty:
+        logging.error("❌ No song data to index.")
+        return 1
+
+    ivf = build_ivf_index(data, args.lists, args.pq or None)
+    print(evaluate_recall(ivf, k=args.k, nprobes=args.nprobe).to_string(index=False))
+    print(f"Index memory: {ivf.memory_bytes / 2 ** 20:.1f} MB "
+          f"(float64 feature frame: {len(ivf) * ivf.centroids.shape[1] * 8 / 2 ** 20:.1f} MB)")
+    song_index = ivf.song_index
+    print(f"Feature matrix: {song_index.matrix.nbytes / 2 ** 20:.1f} MB; exact KD-tree: "
+          + (f"{song_index.tree_memory_bytes / 2 ** 20:.1f} MB" if song_index.tree_memory_bytes else "not built"))
+    ivf.save(args.output)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,294 @@
+"""Headless HTTP/JSON API over the MuzikiRec recommender.
+
+Usage: python api.py [--port 8000] [--workers 4] [--preload]
+
+Every worker process loads the datasets and builds the indexes once at startup,
+then answers JSON requests from an asyncio (Tornado) event loop. With
+``--preload`` they are loaded once before forking and shared copy-on-write:
+
+    GET /recommend?song=<title>[&n=10&artist=&year=&genre=&decade=&popularity_weight=0]
+    GET /recommend?song=<title>&song=<title>...[&artist=&year=...&strategy=centroid|max|quota&diversity=0.2]
+        (the i-th artist and year narrow the i-th song; leave one empty to skip it)
+    GET /search?q=<text>[&limit=10]
+    GET /cluster?kind=songs|genres[&k=25&song=<title>]
+    GET /health
+    GET /metrics    (Prometheus text for the worker that answers)
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.process
+import tornado.web
+
+from loading import import_data, SOUND_FEATURES
+from model import (
+    SEED_STRATEGIES, find_song_positions, get_song_index, load_neighbours, recommend_for_seeds, recommend_songs
+)
+from indexing import get_title_index, get_name_index, get_filter_index
+from clustering import GENRE_CLUSTER_RANGE, SONG_CLUSTER_RANGE, get_cluster_sweep
+from instrumentation import count, registry, render_prometheus
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Track columns returned by the API, when present
+TRACK_COLUMNS = ["id", "name", "artists", "year", "popularity", *SOUND_FEATURES]
+
+# Upper bound on results per request
+MAX_RESULTS = 100
+
+# Cluster sweeps served by /cluster: (k range, default k)
+CLUSTER_KINDS = {"songs": (SONG_CLUSTER_RANGE, 25), "genres": (GENRE_CLUSTER_RANGE, 5)}
+
+# Datasets and warm indexes, loaded once per worker process (or once before forking with --preload)
+class Catalog:
+    """The shared datasets plus every index the endpoints query."""
+
+    def __init__(self):
+        self.data, self.genre_data, self.year_data, self.artist_data = import_data()
+        if self.data is None or self.data.empty:
+            raise RuntimeError("Song data could not be loaded.")
+
+        # Build indexes up front so no request pays for them
+        get_title_index(self.data)
+        get_name_index(self.data)
+        get_song_index(self.data)
+        load_neighbours(self.data)
+        self.filters = get_filter_index(self.data, self.genre_data)
+        logging.info(f"✅ API worker {tornado.process.task_id() or 0} ready with {len(self.data)} tracks.")
+
+    def sweep(self, kind):
+        data = self.data if kind == "songs" else self.genre_data
+        return get_cluster_sweep(data, CLUSTER_KINDS[kind][0], kind) if data is not None else None
+
+# Plain JSON records: missing values become null, numpy scalars become Python numbers
+def to_records(df):
+    columns = [col for col in TRACK_COLUMNS + ["distance", "similarity", "seed"] if col in df.columns]
+    frame = df[columns].astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is pd.NA:
+        return None
+    return str(value)
+
+# Shared request helpers
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, catalog):
+        self.catalog = catalog
+
+    def set_default_headers(self):
+        self.set_header("Content-Type", "application/json")
+
+    def on_finish(self):
+        registry.observe(f"api{self.request.path}", self.request.request_time())
+        count("api_requests", path=self.request.path, status=self.get_status())
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.finish(json.dumps(payload, default=_json_default))
+
+    def write_error(self, status_code, **kwargs):
+        self.finish(json.dumps({"error": self._reason}))
+
+    def get_int(self, name, default, low=None, high=None):
+        return self.to_int(name, self.get_query_argument(name, None), default, low, high)
+
+    @staticmethod
+    def to_int(name, value, default=None, low=None, high=None):
+        if value in (None, ""):
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be an integer.")
+        if (low is not None and value < low) or (high is not None and value > high):
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be between {low} and {high}.")
+        return value
+
+    def get_float(self, name, default, low, high):
+        value = self.get_query_argument(name, None)
+        if value in (None, ""):
+            return default
+        try:
+            value = float(value)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be a number.")
+        if not low <= value <= high:
+            raise tornado.web.HTTPError(400, reason=f"'{name}' must be between {low} and {high}.")
+        return value
+
+    def get_seeds(self):
+        """``(title, artist, year)`` per non-empty ``song``; repeated ``artist``/``year`` pair up by position."""
+        titles, artists, years = (self.get_query_arguments(name) for name in ("song", "artist", "year"))
+        seeds = []
+        for i, title in enumerate(titles):
+            if title.strip():
+                artist = artists[i].strip() if i < len(artists) else ""
+                year = self.to_int("year", years[i]) if i < len(years) else None
+                seeds.append((title.strip(), artist or None, year))
+        return seeds
+
+    def require(self, name):
+        value = self.get_query_argument(name, "").strip()
+        if not value:
+            raise tornado.web.HTTPError(400, reason=f"Missing '{name}' parameter.")
+        return value
+
+    # CPU-bound work runs off the event loop so slow requests do not stall the rest
+    async def run(self, func, *args):
+        return await tornado.ioloop.IOLoop.current().run_in_executor(None, func, *args)
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        self.write_json({"status": "ok", "tracks": len(self.catalog.data)})
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4")
+        self.finish(render_prometheus())
+
+class RecommendHandler(BaseHandler):
+    async def get(self):
+        song = self.require("song")
+        seeds = self.get_seeds()
+        songs = [title for title, _, _ in seeds]
+        n = self.get_int("n", 10, 1, MAX_RESULTS)
+        _, artist, year = seeds[0]
+        popularity_weight = self.get_float("popularity_weight", 0.0, 0.0, 1.0)
+        genre = self.get_query_argument("genre", None) or None
+        decade = self.get_int("decade", None)
+
+        data = self.catalog.data
+        # Title lookups scan the name index and can be slow for vague titles, so they run off the loop too
+        missing = await self.run(
+            lambda: [title for title, seed_artist, seed_year in seeds
+                     if len(find_song_positions(title, data, artist=seed_artist, year=seed_year)) == 0]
+        )
+        if missing:
+            raise tornado.web.HTTPError(404, reason=f"Song '{missing[0]}' not found.")
+
+        candidates = self.catalog.filters.select(genre=genre, decade=decade)
+        if candidates is not None and len(candidates) == 0:
+            self.write_json({"song": song, "recommendations": []})
+            return
+
+        if len(songs) > 1:
+            strategy = self.get_query_argument("strategy", "centroid")
+            if strategy not in SEED_STRATEGIES:
+                raise tornado.web.HTTPError(400, reason=f"'strategy' must be one of {SEED_STRATEGIES}.")
+            diversity = self.get_float("diversity", 0.2, 0.0, 1.0)
+            recommended = await self.run(
+                lambda: recommend_for_seeds(seeds, data, num_recommendations=n, strategy=strategy, diversity=diversity,
+                                            popularity_weight=popularity_weight, candidates=candidates)
+            )
+            self.write_json({"songs": songs, "strategy": strategy, "recommendations": to_records(recommended)})
+            return
+
+        recommended = await self.run(
+            lambda: recommend_songs(song, data, num_recommendations=n, popularity_weight=popularity_weight,
+                                    candidates=candidates, artist=artist, year=year)
+        )
+        self.write_json({"song": song, "recommendations": to_records(recommended)})
+
+class SearchHandler(BaseHandler):
+    async def get(self):
+        query = self.require("q")
+        limit = self.get_int("limit", 10, 1, MAX_RESULTS)
+        data = self.catalog.data
+
+        def search():
+            positions = get_name_index(data).search(query)[:limit]
+            suggestions = get_title_index(data).suggest(query, limit=limit) if len(positions) == 0 else []
+            return positions, suggestions
+
+        positions, suggestions = await self.run(search)
+        self.write_json({
+            "query": query,
+            "tracks": to_records(data.iloc[positions]),
+            "suggestions": [{"title": title, "score": score} for title, score in suggestions],
+        })
+
+class ClusterHandler(BaseHandler):
+    async def get(self):
+        kind = self.get_query_argument("kind", "songs")
+        if kind not in CLUSTER_KINDS:
+            raise tornado.web.HTTPError(400, reason=f"'kind' must be one of {sorted(CLUSTER_KINDS)}.")
+        k_range, default_k = CLUSTER_KINDS[kind]
+        k = self.get_int("k", default_k, k_range.start, k_range.stop - 1)
+
+        sweep = self.catalog.sweep(kind)
+        if sweep is None:
+            raise tornado.web.HTTPError(503, reason=f"No data available for {kind} clustering.")
+        result = await self.run(sweep.result, k)
+
+        sizes = np.bincount(result["labels"], minlength=k)
+        payload = {
+            "kind": kind,
+            "k": k,
+            "inertia": result["inertia"],
+            "silhouette": None if np.isnan(result["silhouette"]) else result["silhouette"],
+            "clusters": [
+                {"cluster": i, "size": int(sizes[i]), "centroid": dict(zip(SOUND_FEATURES, centroid.tolist()))}
+                for i, centroid in enumerate(result["centroids"])
+            ],
+        }
+
+        song = self.get_query_argument("song", "").strip()
+        if song and kind == "songs":
+            positions = await self.run(find_song_positions, song, self.catalog.data)
+            if len(positions) == 0:
+                raise tornado.web.HTTPError(404, reason=f"Song '{song}' not found.")
+            payload["song"] = {"name": self.catalog.data["name"].iat[positions[0]],
+                               "cluster": int(result["labels"][positions[0]])}
+        self.write_json(payload)
+
+# Tornado application serving one catalog
+def make_app(catalog):
+    routes = [
+        (r"/health", HealthHandler),
+        (r"/metrics", MetricsHandler),
+        (r"/recommend", RecommendHandler),
+        (r"/search", SearchHandler),
+        (r"/cluster", ClusterHandler),
+    ]
+    return tornado.web.Application([(path, handler, {"catalog": catalog}) for path, handler in routes])
+
+# Bind once, fork the workers, then load the catalog in each worker
+def main():
+    parser = argparse.ArgumentParser(description="Serve MuzikiRec recommendations over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 = one per CPU)")
+    parser.add_argument("--preload", action="store_true",
+                        help="load datasets and indexes before forking, so workers share one copy")
+    args = parser.parse_args()
+
+    sockets = tornado.netutil.bind_sockets(args.port, address=args.host)
+    # Forked workers share the parent's pages until they write to them; the catalog is read-only
+    catalog = Catalog() if args.preload else None
+    if catalog is not None:
+        # Keep the collector from touching (and so copying) the preloaded objects' pages in every worker
+        gc.freeze()
+    if args.workers != 1:
+        if hasattr(os, "fork"):
+            tornado.process.fork_processes(args.workers)
+        else:
+            logging.warning("⚠️ Multiple workers need os.fork; serving from a single process.")
+
+    server = tornado.httpserver.HTTPServer(make_app(catalog or Catalog()))
+    server.add_sockets(sockets)
+    logging.info(f"Listening on http://{args.host}:{args.port}")
+    tornado.ioloop.IOLoop.current().start()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
 import os
+import threading
+import time
 from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyOAuth
 import spotipy
 import logging
 from dotenv import load_dotenv
 import streamlit as st
 
+from instrumentation import count
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -13,8 +20,54 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 env_path = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-def get_spotify_oauth():
-    """Returns a SpotifyOAuth object initialized with credentials from environment variables."""
+# Refresh access tokens this many seconds before they expire, so no API call runs on a stale token
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
+# Keep-alive connections kept open per host; covers the concurrent track searches of a playlist
+HTTP_POOL_SIZE = 16
+
+# Seconds before a Spotify API or token request times out
+REQUEST_TIMEOUT_SECONDS = 10
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Returns the process-wide HTTP session, so every Spotify client reuses its keep-alive connections."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            # No urllib3 retries here: spotify_utils.call_with_backoff already retries rate limits and 5xx
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+            _http_session = session
+    return _http_session
+
+class RefreshingSpotifyOAuth(SpotifyOAuth):
+    """SpotifyOAuth that refreshes its cached token ahead of expiry, once, even under concurrent calls."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def is_token_expired(token_info):
+        return token_info["expires_at"] - TOKEN_REFRESH_MARGIN_SECONDS < int(time.time())
+
+    def get_access_token(self, code=None, as_dict=False, check_cache=True):
+        # Track searches run on several threads; the first one refreshes, the others reuse its token
+        with self._refresh_lock:
+            return super().get_access_token(code, as_dict=as_dict, check_cache=check_cache)
+
+    def refresh_access_token(self, refresh_token):
+        count("spotify_token_refreshes")
+        return super().refresh_access_token(refresh_token)
+
+def get_spotify_oauth(token_info=None):
+    """Returns a SpotifyOAuth object initialized with credentials from environment variables.
+
+    The token is cached in memory by the returned object; no request is made until it is used.
+    """
     client_id = os.getenv("SPOTIPY_CLIENT_ID")
     client_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
     redirect_uri = os.getenv("SPOTIPY_REDIRECT_URI")
@@ -22,45 +75,60 @@ def get_spotify_oauth():
     if not all([client_id, client_secret, redirect_uri]):
         raise EnvironmentError("Spotify credentials not properly set in .env file.")
 
-    return SpotifyOAuth(
+    return RefreshingSpotifyOAuth(
         client_id=client_id,
         client_secret=client_secret,
         redirect_uri=redirect_uri,
-        scope="playlist-modify-public"
+        scope="playlist-modify-public",
+        cache_handler=MemoryCacheHandler(token_info),
+        requests_session=get_http_session(),
+        requests_timeout=REQUEST_TIMEOUT_SECONDS,
+        open_browser=False
     )
 
-def authenticate_spotify():
-    """Handles Spotify OAuth and stores access token and Spotify client in Streamlit session state."""
-    sp_oauth = get_spotify_oauth()
-    query_params = st.query_params
+def create_spotify_client(sp_oauth):
+    """Returns a Spotify client that authenticates through ``sp_oauth`` over the shared HTTP session."""
+    return spotipy.Spotify(
+        auth_manager=sp_oauth,
+        requests_session=get_http_session(),
+        requests_timeout=REQUEST_TIMEOUT_SECONDS
+    )
 
-    if "access_token" not in st.session_state:
-        code = query_params.get("code", [None])[0]
+def authenticate_spotify():
+    """Returns the session's Spotify client, running the OAuth flow the first time a Spotify action needs it.
 
-        if not code:
-            auth_url = sp_oauth.get_authorize_url()
-            st.markdown(f"[🔐 Click here to login with Spotify]({auth_url})")
-            st.stop()
+    The client is built once per user session and kept in Streamlit session state.
+    """
+    if "spotify" in st.session_state:
+        return st.session_state.spotify
 
-        try:
-            token_info = sp_oauth.get_access_token(code)
-            access_token = token_info.get("access_token")
+    try:
+        sp_oauth = get_spotify_oauth()
+    except EnvironmentError as e:
+        st.error("❌ Spotify credentials missing. Please check your .env file.")
+        logging.error(e)
+        st.stop()
 
-            if not access_token:
-                st.error("⚠️ Failed to obtain access token from Spotify.")
-                st.stop()
+    code = st.query_params.get("code")
+    if not code:
+        auth_url = sp_oauth.get_authorize_url()
+        st.markdown(f"[🔐 Click here to login with Spotify]({auth_url})")
+        st.stop()
 
-            # Save access token and create Spotify client
-            st.session_state.access_token = access_token
-            st.session_state.spotify = spotipy.Spotify(auth=access_token)
-            st.success("✅ Spotify authenticated successfully.")
+    try:
+        access_token = sp_oauth.get_access_token(code, check_cache=False)
 
-        except Exception as e:
-            st.error("❌ Spotify authentication failed.")
-            logging.exception(e)
+        if not access_token:
+            st.error("⚠️ Failed to obtain access token from Spotify.")
             st.stop()
-    else:
-        # Use existing access token
-        st.session_state.spotify = spotipy.Spotify(auth=st.session_state.access_token)
-        st.success("✅ Using existing Spotify session.")
+
+        # The code is single-use; later reruns authenticate with the cached token
+        del st.query_params["code"]
+        st.session_state.spotify = create_spotify_client(sp_oauth)
+        st.success("✅ Spotify authenticated successfully.")
+
+    except Exception as e:
+        st.error("❌ Spotify authentication failed.")
+        logging.exception(e)
+        st.stop()
     return st.session_state.spotify
\ No newline at end of file
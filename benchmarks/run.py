@@ -0,0 +1,279 @@
+"""Headless benchmarks for the MuzikiRec pipeline on synthetic catalogs.
+
+Usage: python -m benchmarks.run --rows 100000 [--rows 1000000 ...] [--stages recommend_songs ...]
+       python -m benchmarks.run --rows 100000 --compare benchmarks/results/100000-<commit>.json
+
+Streamlit is replaced by a no-op stub before the app modules are imported, so
+only the data work is measured. Each stage is timed ``--repeat`` times, then run
+once more under tracemalloc for its peak allocation. Results are written as JSON
+per catalog size and commit, so two commits can be compared with ``--compare``.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+import numpy as np
+
+from benchmarks.synthetic import generate_catalog
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Generated catalogs and their caches, one directory per size
+WORK_DIR = os.path.join(REPO_ROOT, "benchmarks", ".work")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Catalog sizes benchmarked by default
+DEFAULT_ROWS = [100_000, 1_000_000, 10_000_000]
+
+# Titles looked up per query stage
+QUERY_COUNT = 50
+
+# Relative slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.2
+
+# Accepts any Streamlit call and does nothing
+class StreamlitStub:
+    """Stand-in for the ``streamlit`` module: every attribute, call and context manager is a no-op."""
+
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        # Bare decorators such as @st.cache_data return the function unchanged
+        if len(args) == 1 and not kwargs and isinstance(args[0], types.FunctionType):
+            return args[0]
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(())
+
+    def __bool__(self):
+        return False
+
+# Register the stub before any app module imports streamlit
+def stub_streamlit():
+    module = types.ModuleType("streamlit")
+    module.__getattr__ = lambda name: StreamlitStub()
+    sys.modules["streamlit"] = module
+
+# Short commit hash of the benchmarked tree
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+# Time `func` over `repeat` runs, then record its peak allocation in one traced run
+def measure(func, setup=None, repeat=1, memory=True, calls=1):
+    timings = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+
+    result = {
+        "calls": calls,
+        "seconds": {"min": min(timings), "median": float(np.median(timings)), "max": max(timings)},
+        "seconds_per_call": float(np.median(timings)) / calls,
+    }
+    if memory:
+        args = setup() if setup else ()
+        tracemalloc.start()
+        func(*args)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result
+
+# Benchmark stages for one catalog: name -> (func, setup, calls)
+def build_stages(rows, seed):
+    import matplotlib.pyplot as plt
+    import clustering
+    import exploration
+    import indexing
+    import loading
+    import model
+
+    # Background sweeps would compete with the measured stages for CPU
+    clustering.ClusterSweep.start = lambda self: self
+
+    def clear_memory():
+        loading._streamed.clear()
+        indexing._indexes.clear()
+        model._index_cache.clear()
+        model._neighbours.clear()
+        clustering._sweeps.clear()
+        clustering._embeddings.clear()
+        exploration._summaries.clear()
+        plt.close("all")
+
+    def clear_disk(*parts):
+        shutil.rmtree(os.path.join(loading.CACHE_DIR, *parts), ignore_errors=True)
+
+    def cold():
+        clear_memory()
+        clear_disk()
+        loading.dataset_store().clear()
+        return ()
+
+    def from_disk_cache():
+        loading.dataset_store().clear()
+        return ()
+
+    data, genre_data, year_data, artist_data = loading.import_data()
+    rng = np.random.default_rng(seed)
+    titles = data["name"].iloc[rng.choice(len(data), QUERY_COUNT, replace=False)].astype(str).tolist()
+    # Misspelled queries exercise the fuzzy path, not just exact hits
+    typos = [title[:-1] if len(title) > 3 else title for title in titles]
+
+    def recommend_all():
+        for title in titles:
+            model.recommend_songs(title, data)
+
+    def suggest_all(index):
+        for query in typos:
+            index.suggest(query, limit=5)
+
+    def clustered(cluster, frame, k):
+        def setup():
+            clear_memory()
+            clear_disk("embeddings")
+            return (cluster(frame, k),)
+        return setup
+
+    def with_cleared(*parts):
+        def setup():
+            clear_memory()
+            clear_disk(*parts)
+            return ()
+        return setup
+
+    def warm_song_index():
+        model.get_song_index(data)
+        return ()
+
+    return {
+        "import_data (cold)": (loading.import_data, cold, 1),
+        "import_data (cached)": (loading.import_data, from_disk_cache, 1),
+        "stream_dataset (cold)": (lambda: loading.stream_dataset(loading.DATASET_PATHS["Data"]), cold, 1),
+        "create_decade_column": (loading.create_decade_column, lambda: (data.drop(columns="decade"),), 1),
+        "title_index_build": (lambda: indexing.get_title_index(data), with_cleared(), 1),
+        "fuzzy_title_match": (suggest_all, lambda: (indexing.get_title_index(data),), len(typos)),
+        "song_index_build": (lambda: model.get_song_index(data), with_cleared(), 1),
+        "recommend_songs": (recommend_all, warm_song_index, len(titles)),
+        "cluster_songs": (lambda: clustering.cluster_songs(data, 25), with_cleared("clusters"), 1),
+        "cluster_genres": (lambda: clustering.cluster_genres(genre_data, 5), with_cleared("clusters"), 1),
+        "visualize_song_clusters": (clustering.visualize_song_clusters,
+                                    clustered(clustering.cluster_songs, data, 25), 1),
+        "visualize_genre_clusters": (clustering.visualize_genre_clusters,
+                                     clustered(clustering.cluster_genres, genre_data, 5), 1),
+        "visualize_decade_distribution": (lambda: exploration.visualize_decade_distribution(data), with_cleared(), 1),
+        "plot_sound_features_trends": (lambda: exploration.plot_sound_features_trends(data), with_cleared(), 1),
+        "plot_top_genres_trends": (lambda: exploration.plot_top_genres_trends(genre_data), with_cleared(), 1),
+        "generate_genre_wordcloud": (lambda: exploration.generate_genre_wordcloud(genre_data),
+                                     with_cleared("wordclouds"), 1),
+        "generate_artist_wordcloud": (lambda: exploration.generate_artist_wordcloud(artist_data),
+                                      with_cleared("wordclouds"), 1),
+        "top_artists_by_song_count": (lambda: exploration.top_artists_by_song_count(artist_data), with_cleared(), 1),
+        "top_artists_by_popularity": (lambda: exploration.top_artists_by_popularity(artist_data), with_cleared(), 1),
+    }
+
+# Generate (once) and benchmark one catalog size
+def run_catalog(rows, stages=None, repeat=1, memory=True, seed=42):
+    directory = os.path.join(WORK_DIR, str(rows))
+    if not os.path.exists(os.path.join(directory, "datasets", "data_by_artist.csv")):
+        generate_catalog(os.path.join(directory, "datasets"), rows, seed)
+
+    # The app reads datasets/ relative to the working directory
+    previous_dir = os.getcwd()
+    os.chdir(directory)
+    try:
+        shutil.rmtree(os.path.join("datasets", ".cache"), ignore_errors=True)
+        available = build_stages(rows, seed)
+        unknown = set(stages or []) - set(available)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+        results = {}
+        for name, (func, setup, calls) in available.items():
+            if stages and name not in stages:
+                continue
+            logging.info(f"⏱️ {rows} rows: {name}")
+            results[name] = measure(func, setup, repeat=repeat, memory=memory, calls=calls)
+            logging.info(f"   {results[name]['seconds']['median']:.3f}s"
+                         + (f", peak {results[name]['peak_mb']:.1f} MB" if memory else ""))
+        return results
+    finally:
+        os.chdir(previous_dir)
+
+# Per-stage change against a baseline result file
+def compare(current, baseline):
+    lines = []
+    for name, result in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if before is None:
+            continue
+        now, then = result["seconds"]["median"], before["seconds"]["median"]
+        change = (now - then) / then if then else 0.0
+        flag = "  REGRESSION" if change > REGRESSION_THRESHOLD else ""
+        lines.append(f"{name:32s} {then:9.3f}s -> {now:9.3f}s ({change:+.0%}){flag}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MuzikiRec on synthetic catalogs.")
+    parser.add_argument("--rows", type=int, action="append", help="catalog size (repeatable)")
+    parser.add_argument("--stages", nargs="+", help="only run these stages")
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per stage")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", default=RESULTS_DIR, help="where result JSON files are written")
+    parser.add_argument("--compare", help="baseline result JSON to compare against")
+    args = parser.parse_args()
+
+    stub_streamlit()
+    sys.path.insert(0, REPO_ROOT)
+
+    commit = current_commit()
+    os.makedirs(args.output_dir, exist_ok=True)
+    regressions = False
+    for rows in args.rows or DEFAULT_ROWS:
+        report = {
+            "commit": commit,
+            "rows": rows,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "stages": run_catalog(rows, args.stages, args.repeat, not args.no_memory, args.seed),
+        }
+        path = os.path.join(args.output_dir, f"{rows}-{commit}.json")
+        with open(path, "w") as handle:
+            json.dump(report, handle, indent=2)
+        logging.info(f"✅ Results written to {path}.")
+
+        if args.compare:
+            with open(args.compare) as handle:
+                summary = compare(report, json.load(handle))
+            print(summary)
+            regressions = regressions or "REGRESSION" in summary
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
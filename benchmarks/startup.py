@@ -0,0 +1,95 @@
+"""Startup budget for the Streamlit app: time to first paint of the Home page.
+
+Usage: python -m benchmarks.startup [--rows 100000] [--budget 1.0] [--repeat 3]
+
+Each run starts a fresh interpreter and renders the Home page once with
+Streamlit's AppTest, against a synthetic catalog whose dataset cache is already
+built (as after the app's first visit). It reports the import time of the app
+modules, the render time, and any heavy module the Home page imported although
+only other pages use it (modules the test harness itself loads are not
+counted). It exits non-zero when either check fails.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+
+from benchmarks.run import REPO_ROOT, WORK_DIR
+from benchmarks.synthetic import generate_catalog
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Seconds allowed from a fresh process to a rendered Home page
+FIRST_PAINT_BUDGET_SECONDS = 1.0
+
+# Modules the Home page must not import; their pages import them on demand
+DEFERRED_MODULES = ["sklearn", "plotly", "wordcloud", "spotipy", "matplotlib", "seaborn", "fuzzywuzzy", "tornado"]
+
+# Runs in the child process: render Home once and report timings as JSON
+PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+preloaded = set(sys.modules)
+started = time.perf_counter()
+import loading, instrumentation
+imported = time.perf_counter() - started
+app = AppTest.from_file({main!r}, default_timeout=120)
+started = time.perf_counter()
+app.run()
+rendered = time.perf_counter() - started
+errors = [element.value for element in app.exception] + [element.value for element in app.error]
+print(json.dumps({{"import_seconds": imported, "first_paint_seconds": imported + rendered, "errors": errors,
+                  "modules": sorted({{name.split(".")[0] for name in set(sys.modules) - preloaded}})}}))
+"""
+
+# Render the Home page in a fresh interpreter
+def probe(directory):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.getenv("PYTHONPATH")]))}
+    code = PROBE.format(main=os.path.join(REPO_ROOT, "main.py"))
+    output = subprocess.run([sys.executable, "-c", code], cwd=directory, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Home page's time to first paint.")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic catalog size")
+    parser.add_argument("--budget", type=float, default=FIRST_PAINT_BUDGET_SECONDS, help="seconds to first paint")
+    parser.add_argument("--repeat", type=int, default=3, help="measured runs (median is checked)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    directory = os.path.join(WORK_DIR, str(args.rows))
+    if not os.path.exists(os.path.join(directory, "datasets", "data_by_artist.csv")):
+        generate_catalog(os.path.join(directory, "datasets"), args.rows, args.seed)
+    shutil.rmtree(os.path.join(directory, "datasets", ".cache"), ignore_errors=True)
+
+    # The first visit compiles the dataset cache; it is not part of the budget
+    probe(directory)
+    runs = [probe(directory) for _ in range(args.repeat)]
+
+    first_paint = float(np.median([run["first_paint_seconds"] for run in runs]))
+    imports = float(np.median([run["import_seconds"] for run in runs]))
+    eager = [name for name in DEFERRED_MODULES if name in runs[-1]["modules"]]
+    print(f"App module imports: {imports:.3f}s")
+    print(f"Home first paint:   {first_paint:.3f}s (budget {args.budget:.1f}s)")
+    print(f"Deferred modules imported by Home: {', '.join(eager) or 'none'}")
+
+    failed = False
+    if runs[-1]["errors"]:
+        logging.error(f"❌ Home page raised: {runs[-1]['errors']}")
+        failed = True
+    if first_paint > args.budget:
+        logging.error(f"❌ Home first paint {first_paint:.3f}s is over the {args.budget:.1f}s budget.")
+        failed = True
+    if eager:
+        logging.error(f"❌ Home page imported {', '.join(eager)}; import them in the page that needs them.")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
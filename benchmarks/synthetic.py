@@ -0,0 +1,168 @@
+"""Synthetic catalogs with the same schemas as the Spotify datasets in ``datasets/``.
+
+Usage: python -m benchmarks.synthetic --rows 1000000 --output benchmarks/.work/1000000/datasets
+
+Table sizes follow the ratios of the original dataset (about 57 tracks per genre,
+6 per artist, one row per year). ``data.csv`` is written in chunks so 10M-row
+catalogs can be generated without holding them in memory.
+"""
+import argparse
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Column order of each source file
+DATA_COLUMNS = ["valence", "year", "acousticness", "artists", "danceability", "duration_ms", "energy",
+                "explicit", "id", "instrumentalness", "key", "liveness", "loudness", "mode", "name",
+                "popularity", "release_date", "speechiness", "tempo"]
+FEATURE_COLUMNS = ["acousticness", "danceability", "duration_ms", "energy", "instrumentalness",
+                   "liveness", "loudness", "speechiness", "tempo", "valence", "popularity", "key"]
+GENRE_COLUMNS = ["mode", "genres", *FEATURE_COLUMNS]
+YEAR_COLUMNS = ["mode", "year", *FEATURE_COLUMNS]
+ARTIST_COLUMNS = ["mode", "count", "acousticness", "artists", "danceability", "duration_ms", "energy",
+                  "instrumentalness", "liveness", "loudness", "speechiness", "tempo", "valence",
+                  "popularity", "key"]
+
+# Catalog shape, taken from the original dataset
+TRACKS_PER_GENRE = 57
+TRACKS_PER_ARTIST = 6
+YEARS = np.arange(1921, 2021)
+
+# Rows generated and written per chunk of data.csv
+CHUNK_SIZE = 1_000_000
+
+# Share of tracks with a missing sound feature
+MISSING_RATE = 0.001
+
+SYLLABLES = ["la", "mo", "ri", "ka", "ne", "so", "tu", "vi", "da", "el", "an", "or", "be", "lu", "mi",
+             "sha", "ton", "rey", "dan", "gel", "ros", "cor", "lin", "mar", "tin", "ver", "ly", "zo"]
+BASE62 = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"))
+
+# Capitalized pseudo-words built from random syllables
+def make_words(rng, count, syllables=(1, 4)):
+    parts = np.array(SYLLABLES, dtype=object)[rng.integers(0, len(SYLLABLES), (count, syllables[1] - 1))]
+    lengths = rng.integers(syllables[0], syllables[1], count)
+    words = parts[:, 0]
+    for i in range(1, parts.shape[1]):
+        words = np.where(lengths > i, words + parts[:, i], words)
+    return np.array([word.capitalize() for word in words], dtype=object)
+
+# Multi-word phrases drawn from a vocabulary, e.g. track titles and artist names
+def make_phrases(rng, vocabulary, count, max_words=4):
+    picks = vocabulary[rng.integers(0, len(vocabulary), (count, max_words))]
+    lengths = rng.integers(1, max_words + 1, count)
+    phrases = picks[:, 0]
+    for i in range(1, max_words):
+        phrases = np.where(lengths > i, phrases + " " + picks[:, i], phrases)
+    return phrases
+
+# Spotify-style 22-character base62 ids
+def make_ids(rng, count):
+    chars = BASE62[rng.integers(0, len(BASE62), (count, 22))]
+    return np.ascontiguousarray(chars).view("<U22").ravel()
+
+# Audio features shared by every table
+def make_features(rng, count):
+    return {
+        "acousticness": rng.beta(0.6, 0.8, count),
+        "danceability": rng.beta(4, 3.5, count),
+        "duration_ms": rng.integers(60_000, 420_000, count),
+        "energy": rng.beta(2, 2, count),
+        "instrumentalness": rng.beta(0.2, 1.5, count),
+        "liveness": rng.beta(1.5, 6, count),
+        "loudness": -rng.gamma(2.5, 4, count),
+        "speechiness": rng.beta(0.8, 8, count),
+        "tempo": rng.normal(118, 30, count).clip(40, 220),
+        "valence": rng.beta(2, 2, count),
+        "key": rng.integers(0, 12, count),
+    }
+
+# One chunk of data.csv
+def make_tracks(rng, count, title_words, artist_names):
+    features = make_features(rng, count)
+    years = rng.choice(YEARS, count, p=np.linspace(1, 4, len(YEARS)) / np.linspace(1, 4, len(YEARS)).sum())
+
+    titles = make_phrases(rng, title_words, count)
+    versions = rng.random(count)
+    titles = np.where(versions < 0.04, titles + " - Remastered", titles)
+    titles = np.where((versions >= 0.04) & (versions < 0.06), titles + " (Live)", titles)
+
+    # Artist lists are stored as Python list literals, mostly with one artist
+    first = artist_names[rng.integers(0, len(artist_names), count)]
+    second = artist_names[rng.integers(0, len(artist_names), count)]
+    artists = np.where(rng.random(count) < 0.15, "['" + first + "', '" + second + "']", "['" + first + "']")
+
+    # Release dates are either a full date or just the year
+    days = rng.integers(0, 365, count).astype("timedelta64[D]")
+    dates = (years.astype(str).astype("datetime64[D]") + days).astype(str)
+    release_dates = np.where(rng.random(count) < 0.7, dates, years.astype(str))
+
+    tracks = pd.DataFrame({
+        "valence": features["valence"],
+        "year": years,
+        "acousticness": features["acousticness"],
+        "artists": artists,
+        "danceability": features["danceability"],
+        "duration_ms": features["duration_ms"],
+        "energy": features["energy"],
+        "explicit": (rng.random(count) < 0.08).astype(np.int8),
+        "id": make_ids(rng, count),
+        "instrumentalness": features["instrumentalness"],
+        "key": features["key"],
+        "liveness": features["liveness"],
+        "loudness": features["loudness"],
+        "mode": (rng.random(count) < 0.7).astype(np.int8),
+        "name": titles,
+        "popularity": rng.binomial(100, 0.3, count),
+        "release_date": release_dates,
+        "speechiness": features["speechiness"],
+        "tempo": features["tempo"],
+    })
+    tracks.loc[rng.random(count) < MISSING_RATE, "valence"] = np.nan
+    return tracks[DATA_COLUMNS]
+
+# Aggregate table with one row per key, e.g. data_by_genres.csv
+def make_summary(rng, key_column, keys, columns):
+    table = pd.DataFrame({"mode": (rng.random(len(keys)) < 0.7).astype(np.int8), key_column: keys,
+                          "count": rng.integers(1, 200, len(keys)), "popularity": rng.uniform(0, 80, len(keys)),
+                          **make_features(rng, len(keys))})
+    return table[columns]
+
+# Write all four CSVs for a catalog of `rows` tracks into `directory`
+def generate_catalog(directory, rows, seed=42, chunk_size=CHUNK_SIZE):
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    title_words = make_words(rng, 5000)
+    artist_count = max(rows // TRACKS_PER_ARTIST, 1)
+    artist_names = pd.unique(make_phrases(rng, make_words(rng, 20000), artist_count * 2, max_words=3))[:artist_count]
+    genre_count = max(rows // TRACKS_PER_GENRE, 10)
+    genre_words = make_words(rng, 400)
+    genres = pd.unique(make_phrases(rng, genre_words, genre_count * 3, max_words=3))[:genre_count]
+
+    path = os.path.join(directory, "data.csv")
+    tmp_path = f"{path}.tmp"
+    for start in range(0, rows, chunk_size):
+        chunk = make_tracks(rng, min(chunk_size, rows - start), title_words, artist_names)
+        chunk.to_csv(tmp_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        logging.info(f"Generated {start + len(chunk)}/{rows} tracks.")
+    os.replace(tmp_path, path)
+
+    make_summary(rng, "genres", np.char.lower(genres.astype(str)), GENRE_COLUMNS).to_csv(
+        os.path.join(directory, "data_by_genres.csv"), index=False)
+    make_summary(rng, "year", YEARS, YEAR_COLUMNS).to_csv(os.path.join(directory, "data_by_year.csv"), index=False)
+    make_summary(rng, "artists", artist_names, ARTIST_COLUMNS).to_csv(
+        os.path.join(directory, "data_by_artist.csv"), index=False)
+    logging.info(f"✅ Synthetic catalog of {rows} tracks written to {directory}.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic MuzikiRec catalog.")
+    parser.add_argument("--rows", type=int, default=100_000, help="tracks in data.csv")
+    parser.add_argument("--output", default="datasets", help="directory for the four CSVs")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate_catalog(args.output, args.rows, args.seed)
@@ -1,20 +1,321 @@
+import os
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import MinMaxScaler
-from sklearn.manifold import TSNE
-from sklearn.decomposition import PCA
 from sklearn.impute import SimpleImputer
 import plotly.express as px
 import streamlit as st
 
+from instrumentation import record_cache, timed
+from loading import CACHE_DIR, SCALED_SUFFIX, SOUND_FEATURES, dataset_version, on_dataset_evicted
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+# Cluster counts offered by the Clustering page sliders
+GENRE_CLUSTER_RANGE = range(3, 16)
+SONG_CLUSTER_RANGE = range(5, 31)
+
+# Rows sampled when scoring a clustering with the silhouette coefficient
+SILHOUETTE_SAMPLE = 5000
+
+# Labels and centroids of every fitted k are persisted here
+CLUSTER_CACHE_DIR = os.path.join(CACHE_DIR, "clusters")
+
+# 2D embeddings are persisted here, keyed by dataset version and method config
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, "embeddings")
+
+# t-SNE settings; part of the embedding cache key
+TSNE_PERPLEXITY = 30
+
+# Embeddings kept in memory at once
+EMBEDDING_MEMORY_SIZE = 8
+
+_embeddings = OrderedDict()
+
+# Largest point count drawn as SVG; bigger plots switch to WebGL
+SVG_POINT_LIMIT = 5000
+
+# Most points sent to the browser in a single scatter plot
+MAX_RENDER_POINTS = 50000
+
+# Points always kept per cluster when downsampling, so small clusters stay visible
+MIN_POINTS_PER_CLUSTER = 200
+
+# Grid cells per axis when aggregating points into a density plot
+DENSITY_BINS = 60
+
+# Scatter render modes offered on the Clustering page
+RENDER_MODES = ["auto", "sample", "density"]
+
+# Appended rows keep a k's centroids while the catalog's mean squared distance to the nearest
+# centroid grows by at most this share; past it, that k is refitted
+CLUSTER_DRIFT_THRESHOLD = 0.25
+
+# Share of appended rows above which every k is refitted regardless of drift
+CLUSTER_REFIT_SHARE = 0.1
+
+# Sweeps run one at a time in the background
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cluster-sweep")
+_sweeps = {}
+_sweeps_lock = threading.Lock()
+
+# Imputed, min-max scaled sound features; reuses the loader's derived columns when present
+def scaled_features(data):
+    scaled_cols = [f"{col}{SCALED_SUFFIX}" for col in SOUND_FEATURES]
+    if set(scaled_cols).issubset(data.columns):
+        return data[scaled_cols].to_numpy(dtype=np.float32)
+    imputed = SimpleImputer(strategy="mean").fit_transform(data[SOUND_FEATURES])
+    return MinMaxScaler().fit_transform(imputed).astype(np.float32)
+
+# MiniBatchKMeans fits across a range of k, warm-started from k - 1
+class ClusterSweep:
+    """Fits every k in ``k_range`` over one prepared feature matrix.
+
+    Each fit starts from the previous k's centroids plus one new k-means++ seed.
+    Labels, centroids, inertia and silhouette are kept in memory and saved per k,
+    so moving a slider is a lookup once the sweep has passed that k.
+    """
+
+    def __init__(self, features, k_range, cache_key, random_state=42):
+        self.features = features
+        self.k_range = k_range
+        self.cache_dir = os.path.join(CLUSTER_CACHE_DIR, cache_key)
+        self.random_state = random_state
+        self.results = {}
+        self.future = None
+        self._lock = threading.Lock()
+
+    def _path(self, k):
+        return os.path.join(self.cache_dir, f"k{k}.npz")
+
+    def _load(self, k):
+        path = self._path(k)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as saved:
+                result = {key: saved[key] for key in saved.files}
+            result["inertia"], result["silhouette"] = float(result["inertia"]), float(result["silhouette"])
+            return result
+        except Exception as e:
+            logging.warning(f"⚠️ Ignoring unreadable cluster cache {path}: {e}")
+            return None
+
+    def _save(self, k, result):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._path(k) + ".tmp.npz"
+            np.savez(tmp_path, **result)
+            os.replace(tmp_path, self._path(k))
+        except Exception as e:
+            logging.warning(f"⚠️ Could not save clustering for k={k}: {e}")
+
+    def _warm_start(self, k):
+        # Previous centroids plus one new seed drawn proportional to squared distance
+        previous = self.results.get(k - 1)
+        if previous is None or len(self.features) <= k:
+            return "k-means++"
+        centroids = previous["centroids"]
+        rng = np.random.default_rng(self.random_state + k)
+        sample = self.features[rng.choice(len(self.features), min(len(self.features), 20000), replace=False)]
+        distances = ((sample[:, np.newaxis, :] - centroids[np.newaxis, :, :]) ** 2).sum(axis=2).min(axis=1)
+        if distances.sum() <= 0:
+            return "k-means++"
+        seed = sample[rng.choice(len(sample), p=distances / distances.sum())]
+        return np.vstack([centroids, seed])
+
+    @timed("clustering.kmeans_fit")
+    def _fit(self, k):
+        init = self._warm_start(k)
+        kmeans = MiniBatchKMeans(n_clusters=k, init=init, n_init=1 if not isinstance(init, str) else "auto",
+                                 batch_size=4096, random_state=self.random_state)
+        labels = kmeans.fit_predict(self.features)
+
+        silhouette = np.nan
+        if 1 < k < len(self.features):
+            silhouette = silhouette_score(self.features, labels, sample_size=min(SILHOUETTE_SAMPLE, len(self.features)),
+                                          random_state=self.random_state)
+        return {
+            "labels": labels.astype(np.int16),
+            "centroids": kmeans.cluster_centers_.astype(np.float32),
+            "inertia": float(kmeans.inertia_),
+            "silhouette": float(silhouette),
+        }
+
+    def result(self, k):
+        """Labels, centroids, inertia and silhouette for ``k``, fitting it now if the sweep has not."""
+        if k in self.results:
+            record_cache("cluster_result", True)
+            return self.results[k]
+        with self._lock:
+            if k not in self.results:
+                record_cache("cluster_result", False)
+                result = self._load(k)
+                record_cache("cluster_file", result is not None)
+                if result is None:
+                    result = self._fit(k)
+                    self._save(k, result)
+                self.results[k] = result
+            return self.results[k]
+
+    def run(self):
+        for k in self.k_range:
+            self.result(k)
+        logging.info(f"✅ Cluster sweep finished for k={self.k_range.start}..{self.k_range.stop - 1}.")
+
+    def start(self):
+        if self.future is None:
+            self.future = _executor.submit(self.run)
+        return self
+
+    def metrics(self):
+        """Inertia and silhouette of every k fitted so far."""
+        rows = [{"k": k, "inertia": r["inertia"], "silhouette": r["silhouette"]}
+                for k, r in sorted(self.results.items())]
+        return pd.DataFrame(rows, columns=["k", "inertia", "silhouette"])
+
+# Background sweep for a dataset, created once per dataset version
+def get_cluster_sweep(data, k_range, name):
+    key = f"{name}-{dataset_version(data)}-{k_range.start}-{k_range.stop}"
+    with _sweeps_lock:
+        if key not in _sweeps:
+            _sweeps[key] = ClusterSweep(scaled_features(data), k_range, key).start()
+        return _sweeps[key]
+
+# Sweep for `data`, whose leading rows are `previous`: appended rows join their nearest existing centroid
+@timed("clustering.extend_cluster_sweep")
+def extend_cluster_sweep(previous, data, k_range, name, rescaled=False):
+    """Carry the fitted results for ``previous`` over to ``data`` without refitting.
+
+    Each k fitted for ``previous`` (in memory or on disk) labels the appended rows by
+    their nearest centroid (k-means ``predict``). A k is left to be refitted instead
+    once appends since its last fit raised the mean squared distance to the centroids
+    by more than ``CLUSTER_DRIFT_THRESHOLD``, and every k is when the scaling changed
+    or too many rows were appended.
+    Returns the new sweep and the list of fitted k that will be refitted.
+    """
+    old_key = f"{name}-{dataset_version(previous)}-{k_range.start}-{k_range.stop}"
+    key = f"{name}-{dataset_version(data)}-{k_range.start}-{k_range.stop}"
+    with _sweeps_lock:
+        old_sweep = _sweeps.get(old_key) or ClusterSweep(None, k_range, old_key)
+    sweep = ClusterSweep(scaled_features(data), k_range, key)
+    appended = sweep.features[len(previous):]
+    refit_all = rescaled or len(appended) > CLUSTER_REFIT_SHARE * len(previous)
+
+    refit = []
+    for k in k_range:
+        result = old_sweep.results.get(k) or old_sweep._load(k)
+        if result is None or len(result["labels"]) != len(previous):
+            # Never fitted for the old version; the sweep fits it as usual
+            continue
+        centroids = result["centroids"]
+        distances = ((appended[:, np.newaxis, :] - centroids[np.newaxis, :, :]) ** 2).sum(axis=2)
+        nearest = distances.min(axis=1)
+        # Drift: growth of the catalog's mean squared distance to the nearest centroid since the last fit
+        baseline = float(result.get("baseline", result["inertia"] / max(len(previous), 1)))
+        updated = (result["inertia"] + float(nearest.sum())) / max(len(sweep.features), 1)
+        if refit_all or updated > (1 + CLUSTER_DRIFT_THRESHOLD) * baseline:
+            refit.append(k)
+            continue
+        carried = {
+            "labels": np.concatenate([result["labels"], distances.argmin(axis=1).astype(np.int16)]),
+            "centroids": centroids,
+            "inertia": result["inertia"] + float(nearest.sum()),
+            "silhouette": result["silhouette"],
+            "baseline": baseline,
+        }
+        sweep.results[k] = carried
+        sweep._save(k, carried)
+
+    with _sweeps_lock:
+        _sweeps[key] = sweep.start()
+    if refit:
+        logging.info(f"Refitting {name} clusters for k={refit}.")
+    logging.info(f"✅ {len(appended)} rows assigned to existing {name} clusters for {len(sweep.results)} k.")
+    return sweep, refit
+
+# Drop the in-memory sweeps of a frame the dataset store let go of; fitted results stay on disk
+@on_dataset_evicted
+def _release_sweeps(name, data):
+    version = dataset_version(data)
+    with _sweeps_lock:
+        for key in [key for key in _sweeps if f"-{version}-" in key]:
+            del _sweeps[key]
+
+# Attach sweep labels for k to the columns the visualizations use
+def _with_clusters(data, sweep, n_clusters, keep):
+    labels = sweep.result(n_clusters)["labels"]
+    scaled_cols = [f"{col}{SCALED_SUFFIX}" for col in SOUND_FEATURES]
+    columns = [col for col in [*keep, *scaled_cols] if col in data.columns]
+    clustered = data[columns].assign(cluster=labels)
+    # Same rows and features for every k, so embeddings keyed by this version survive slider moves
+    dataset_version(clustered, f"{dataset_version(data)}-clustered")
+    return clustered
+
+# Fit a 2D t-SNE or PCA embedding
+def _fit_embedding(features, method):
+    # Imported here: embeddings are usually read from disk, and these imports are slow
+    from sklearn.decomposition import PCA
+    from sklearn.manifold import TSNE
+
+    if method == "tsne":
+        # PCA initialization and Barnes-Hut gradients on every core keep the full table tractable
+        perplexity = min(TSNE_PERPLEXITY, max(len(features) - 1, 1) / 3)
+        tsne = TSNE(n_components=2, perplexity=perplexity, init="pca", method="barnes_hut",
+                    angle=0.5, n_jobs=-1, random_state=42)
+        return tsne.fit_transform(features).astype(np.float32)
+    return PCA(n_components=2, random_state=42).fit_transform(features).astype(np.float32)
+
+# 2D embedding of a dataset's scaled features, computed once per dataset version and config and stored on disk
+def embed_features(data, method="tsne"):
+    config = f"tsne-p{TSNE_PERPLEXITY}" if method == "tsne" else method
+    key = f"{dataset_version(data)}-{config}"
+    if key in _embeddings:
+        record_cache("embedding", True)
+        _embeddings.move_to_end(key)
+        return _embeddings[key]
+
+    path = os.path.join(EMBEDDING_CACHE_DIR, f"{key}.npy")
+    embed = None
+    if os.path.exists(path):
+        try:
+            embed = np.load(path)
+        except Exception as e:
+            logging.warning(f"⚠️ Ignoring unreadable embedding cache {path}: {e}")
+
+    record_cache("embedding", embed is not None)
+    if embed is None:
+        features = scaled_features(data)
+        embed = timed(f"clustering.{method}_fit")(_fit_embedding)(features, method)
+        try:
+            os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+            np.save(path, embed)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not save embedding to {path}: {e}")
+        logging.info(f"✅ {method.upper()} embedding computed for {len(features)} rows.")
+
+    _embeddings[key] = embed
+    while len(_embeddings) > EMBEDDING_MEMORY_SIZE:
+        _embeddings.popitem(last=False)
+    return embed
+
+# Labels for hover text, with missing values shown as "Unknown"
+def _hover_labels(data, column):
+    if column not in data.columns:
+        return np.full(len(data), "Unknown", dtype=object)
+    return data[column].astype("string").fillna("Unknown").to_numpy(dtype=object)
+
 # Cluster genres based on sound features
-@st.cache_data
+@timed("clustering.cluster_genres")
 def cluster_genres(data, n_clusters=5):
-    required = ['valence', 'energy', 'danceability', 'acousticness']
+    required = SOUND_FEATURES
     missing = [col for col in required if col not in data.columns]
 
     if missing:
@@ -22,39 +323,83 @@ def cluster_genres(data, n_clusters=5):
         logging.warning(f"Missing columns for genre clustering: {missing}")
         return None
 
-    features = MinMaxScaler().fit_transform(SimpleImputer(strategy="mean").fit_transform(data[required]))
-    kmeans = KMeans(n_clusters=n_clusters, init="k-means++", n_init="auto", random_state=42)
-    data = data.copy()
-    data["cluster"] = kmeans.fit_predict(features)
-    return data
+    sweep = get_cluster_sweep(data, GENRE_CLUSTER_RANGE, "genres")
+    return _with_clusters(data, sweep, n_clusters, ["genres", *required])
+
+# Resolve "auto" to a concrete render mode for n points
+def choose_render_mode(n_points, mode="auto"):
+    if mode != "auto":
+        return mode
+    if n_points <= SVG_POINT_LIMIT:
+        return "svg"
+    if n_points <= MAX_RENDER_POINTS:
+        return "webgl"
+    return "sample"
+
+# Stratified sample of row positions: each cluster keeps its share, with a floor for small clusters
+def downsample_per_cluster(clusters, max_points, random_state=42):
+    if len(clusters) <= max_points:
+        return np.arange(len(clusters))
+
+    rng = np.random.default_rng(random_state)
+    uniques, counts = np.unique(clusters, return_counts=True)
+    quotas = np.maximum(counts * max_points // len(clusters), np.minimum(counts, MIN_POINTS_PER_CLUSTER))
+    keep = []
+    for cluster, quota in zip(uniques, quotas):
+        members = np.flatnonzero(clusters == cluster)
+        keep.append(members if quota >= len(members) else rng.choice(members, quota, replace=False))
+    return np.sort(np.concatenate(keep))
+
+# Aggregate points into grid cells per cluster: cell centroid plus point count
+def bin_per_cluster(embed, clusters, bins=DENSITY_BINS):
+    low = embed.min(axis=0)
+    span = embed.max(axis=0) - low
+    span[span == 0] = 1.0
+    cells = np.minimum(((embed - low) / span * bins).astype(np.int32), bins - 1)
+
+    frame = pd.DataFrame({"cluster": clusters, "cell_x": cells[:, 0], "cell_y": cells[:, 1],
+                          "x": embed[:, 0], "y": embed[:, 1]})
+    binned = frame.groupby(["cluster", "cell_x", "cell_y"], observed=True).agg(
+        x=("x", "mean"), y=("y", "mean"), count=("x", "size"))
+    return binned.reset_index()
+
+# Scatter plot of a 2D embedding colored by cluster, with payload bounded regardless of row count
+def cluster_scatter(embed, data, hover_col, title, mode="auto"):
+    clusters = data["cluster"].to_numpy()
+    mode = choose_render_mode(len(data), mode)
+
+    if mode == "density":
+        plot_df = bin_per_cluster(embed, clusters)
+        return px.scatter(plot_df, x='x', y='y', color='cluster', size='count', hover_data=['count'],
+                          render_mode="webgl", title=f"{title} (density of {len(data):,} points)")
+
+    keep = downsample_per_cluster(clusters, MAX_RENDER_POINTS) if mode == "sample" else np.arange(len(data))
+    plot_df = pd.DataFrame(embed[keep], columns=['x', 'y'])
+    plot_df['cluster'] = clusters[keep]
+    plot_df[hover_col] = _hover_labels(data.iloc[keep], hover_col)
+    if len(keep) < len(data):
+        title = f"{title} (showing {len(keep):,} of {len(data):,} points)"
+    return px.scatter(plot_df, x='x', y='y', color='cluster', hover_data=[hover_col],
+                      render_mode="svg" if mode == "svg" else "webgl", title=title)
 
 # Visualize genre clusters using t-SNE
-@st.cache_data
-def visualize_genre_clusters(data):
+@timed("clustering.visualize_genre_clusters")
+def visualize_genre_clusters(data, mode="auto"):
     st.subheader("Genre Clusters Visualization")
 
     if data is not None and "cluster" in data.columns:
-        if len(data) > 1000:
-            data = data.sample(n=1000, random_state=42)
-            logging.info("📉 Sampled 1000 rows for t-SNE visualization.")
-
-        tsne = TSNE(n_components=2, perplexity=30, random_state=42)
-        embed = tsne.fit_transform(data[['valence', 'energy', 'danceability', 'acousticness']])
+        with st.spinner("Embedding genres with t-SNE (cached after the first run)..."):
+            embed = embed_features(data, "tsne")
 
-        tsne_df = pd.DataFrame(embed, columns=['x', 'y'])
-        tsne_df['cluster'] = data['cluster']
-        tsne_df['genres'] = data.get('genres', pd.Series(["Unknown"] * len(data))).fillna("Unknown")
-
-        fig = px.scatter(tsne_df, x='x', y='y', color='cluster',
-                         hover_data=['genres'], title="t-SNE Visualization of Genre Clusters")
+        fig = cluster_scatter(embed, data, 'genres', "t-SNE Visualization of Genre Clusters", mode)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("Clustering not performed or missing 'cluster' column.")
 
 # Cluster songs based on sound features
-@st.cache_data
+@timed("clustering.cluster_songs")
 def cluster_songs(data, n_clusters=25):
-    required = ['valence', 'energy', 'danceability', 'acousticness']
+    required = SOUND_FEATURES
     missing = [col for col in required if col not in data.columns]
 
     if missing:
@@ -62,27 +407,24 @@ def cluster_songs(data, n_clusters=25):
         logging.warning(f"Missing columns for song clustering: {missing}")
         return None
 
-    features = MinMaxScaler().fit_transform(SimpleImputer(strategy="mean").fit_transform(data[required]))
-    kmeans = KMeans(n_clusters=n_clusters, init="k-means++", n_init="auto", random_state=42)
-    data = data.copy()
-    data["cluster"] = kmeans.fit_predict(features)
-    return data
+    sweep = get_cluster_sweep(data, SONG_CLUSTER_RANGE, "songs")
+    return _with_clusters(data, sweep, n_clusters, ["name", "artists", *required])
+
+# Inertia and silhouette per k for the song clustering sweep
+def song_cluster_metrics(data):
+    if any(col not in data.columns for col in SOUND_FEATURES):
+        return pd.DataFrame(columns=["k", "inertia", "silhouette"])
+    return get_cluster_sweep(data, SONG_CLUSTER_RANGE, "songs").metrics()
 
 # Visualize song clusters using PCA
-@st.cache_data
-def visualize_song_clusters(data):
+@timed("clustering.visualize_song_clusters")
+def visualize_song_clusters(data, mode="auto"):
     st.subheader("Song Clusters Visualization")
 
     if data is not None and "cluster" in data.columns:
-        pca = PCA(n_components=2, random_state=42)
-        embed = pca.fit_transform(data[['valence', 'energy', 'danceability', 'acousticness']])
-
-        pca_df = pd.DataFrame(embed, columns=['x', 'y'])
-        pca_df['cluster'] = data['cluster']
-        pca_df['song_name'] = data.get('name', pd.Series(["Unknown"] * len(data))).fillna("Unknown")
+        embed = embed_features(data, "pca")
 
-        fig = px.scatter(pca_df, x='x', y='y', color='cluster',
-                         hover_data=['song_name'], title="PCA Visualization of Song Clusters")
+        fig = cluster_scatter(embed, data, 'name', "PCA Visualization of Song Clusters", mode)
         st.plotly_chart(fig, use_container_width=True)
     else:
         st.warning("Clustering not performed or missing 'cluster' column.")
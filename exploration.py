@@ -1,37 +1,189 @@
+import os
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import streamlit as st
-import seaborn as sns
-import matplotlib.pyplot as plt
 import plotly.express as px
-from wordcloud import WordCloud
+
+from instrumentation import record_cache, timed
+from loading import CACHE_DIR, compute_decade, dataset_version
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+# Sound features charted over time
+TREND_FEATURES = ['acousticness', 'danceability', 'energy', 'instrumentalness', 'liveness', 'valence']
+
+# Other per-period aggregates kept in the trend cube
+TREND_EXTRAS = ['loudness', 'popularity']
+
+# Bars shown in the top-artist charts
+TOP_ARTISTS = 10
+
+# Number of cubes and artist rankings kept alive at once
+SUMMARY_CACHE_SIZE = 8
+
+# Rendered word clouds, one PNG per dataset version and rendering parameters
+WORDCLOUD_DIR = os.path.join(CACHE_DIR, "wordclouds")
+
+WORDCLOUD_PARAMS = {"width": 800, "height": 400, "background_color": "white", "max_words": 40}
+
+# Process-wide trend cubes and rankings keyed by dataset version
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+
+# Per-year and per-decade aggregates behind every trend chart
+class TrendCube:
+    """Track counts and feature means per year, rolled up to decades.
+
+    Built from per-year sums and non-null counts, so decade means are exact
+    rather than averages of yearly averages.
+    """
+
+    def __init__(self, sums, counts, track_counts):
+        self.features = list(sums.columns)
+        self.by_year = self._means(sums, counts, track_counts)
+        decades = compute_decade(pd.Series(sums.index, index=sums.index))
+        self.by_decade = self._means(sums.groupby(decades).sum(), counts.groupby(decades).sum(),
+                                     track_counts.groupby(decades).sum(min_count=1))
+
+    @staticmethod
+    def _means(sums, counts, track_counts):
+        means = (sums / counts.where(counts > 0)).astype(np.float32)
+        means.insert(0, "track_count", track_counts)
+        return means
+
+    def trend(self, period="decade"):
+        """Aggregates per ``period`` ("decade" or "year") with the period as a column."""
+        table = self.by_decade if period == "decade" else self.by_year
+        return table.rename_axis(period).reset_index()
+
+# One grouped pass over the catalog: per-year feature sums, non-null counts and track counts
+def build_trend_cube(data=None, year_data=None):
+    if data is not None and not data.empty and "year" in data.columns:
+        columns = [col for col in TREND_FEATURES + TREND_EXTRAS if col in data.columns]
+        years = pd.to_numeric(data["year"], errors="coerce").rename("year")
+        grouped = data[columns].astype(np.float64).groupby(years)
+        return TrendCube(grouped.sum(), grouped.count(), grouped.size().astype("Int64"))
+
+    # data_by_year.csv already holds one row of means per year, without track counts
+    if year_data is not None and not year_data.empty and "year" in year_data.columns:
+        columns = [col for col in TREND_FEATURES + TREND_EXTRAS if col in year_data.columns]
+        means = year_data.set_index(pd.to_numeric(year_data["year"], errors="coerce"))[columns].astype(np.float64)
+        track_counts = pd.Series(pd.NA, index=means.index, dtype="Int64")
+        return TrendCube(means.fillna(0.0), means.notna().astype(np.int64), track_counts)
+    return None
+
+# Cached summary of one or two datasets, built once per dataset version
+def _get_summary(kind, build, *frames):
+    key = (kind, *(None if frame is None else dataset_version(frame) for frame in frames))
+    with _summaries_lock:
+        record_cache(kind, key in _summaries)
+        if key not in _summaries:
+            _summaries[key] = build(*frames)
+            while len(_summaries) > SUMMARY_CACHE_SIZE:
+                _summaries.popitem(last=False)
+        _summaries.move_to_end(key)
+        return _summaries[key]
+
+# Trend cube for the catalog, falling back to year_data when the catalog has no years
+def get_trend_cube(data, year_data=None):
+    if data is not None and "year" in data.columns:
+        return _get_summary("trend_cube", build_trend_cube, data)
+    return _get_summary("trend_cube", lambda _, years: build_trend_cube(None, years), data, year_data)
+
+# Top artists by song count and by mean popularity
+def build_artist_rankings(data, n=TOP_ARTISTS):
+    rankings = {}
+    if "artists" not in data.columns:
+        return rankings
+
+    # data_by_artist.csv has one row per artist with a song count; song-level data is counted
+    if "count" in data.columns:
+        counts = data.groupby("artists", observed=True)["count"].sum()
+    else:
+        counts = data["artists"].value_counts()
+    top = counts.nlargest(n).reset_index()
+    top.columns = ["Artist", "Song Count"]
+    rankings["song_count"] = top
+
+    if "popularity" in data.columns:
+        rankings["popularity"] = data.groupby("artists", observed=True)["popularity"].mean().nlargest(n).reset_index()
+    return rankings
+
+# Artist rankings, built once per dataset version
+def get_artist_rankings(data):
+    return _get_summary("artist_rankings", build_artist_rankings, data)
+
+# Genre term frequencies: genres are split into words so shared terms like "rock" add up
+def genre_frequencies(genre_data):
+    return genre_data["genres"].dropna().astype(str).str.split().explode().value_counts()
+
+# Artist frequencies with multi-word names kept whole; list literals count each credited artist
+def artist_frequencies(data):
+    artists = data["artists"].astype("string")
+    names = artists.str.strip("[]").str.split(r"['\"],\s*['\"]", regex=True).explode().str.strip("'\" ")
+    if "count" in data.columns:
+        # data_by_artist.csv: one row per artist with its song count
+        weights = data["count"].reindex(names.index).fillna(0)
+        frequencies = weights.groupby(names.to_numpy()).sum()
+    else:
+        frequencies = names.value_counts()
+    return frequencies[frequencies.index.astype(str).str.len() > 0]
+
+# Path of a word cloud PNG, rendered from term frequencies on first use and read from disk after
+def wordcloud_image(data, kind, frequencies, **params):
+    params = {**WORDCLOUD_PARAMS, **params}
+    digest = hashlib.sha1(repr(sorted(params.items())).encode()).hexdigest()[:8]
+    path = os.path.join(WORDCLOUD_DIR, f"{kind}-{dataset_version(data)}-{digest}.png")
+    record_cache("wordcloud", os.path.exists(path))
+    if os.path.exists(path):
+        return path
+
+    from wordcloud import WordCloud
+
+    counts = frequencies(data).nlargest(params["max_words"])
+    image = WordCloud(**params).generate_from_frequencies(counts.astype(float).to_dict())
+    try:
+        os.makedirs(WORDCLOUD_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp.png"
+        image.to_file(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        logging.warning(f"⚠️ Could not cache word cloud {path}: {e}")
+        return image.to_array()
+
 # Tracks per Decade
-def visualize_decade_distribution(data):
+@timed("exploration.visualize_decade_distribution")
+def visualize_decade_distribution(data, year_data=None):
     st.subheader("Tracks Distribution Across Decades")
-    if "decade" in data.columns and not data.empty:
-        decade_counts = data.groupby("decade").size().reset_index(name="track_count")
+    cube = get_trend_cube(data, year_data)
+    if cube is not None and cube.by_decade["track_count"].notna().any():
+        decade_counts = cube.trend("decade")[["decade", "track_count"]].dropna()
         fig = px.line(decade_counts, x="decade", y="track_count", markers=True,
                       hover_data=["decade", "track_count"], title="Track Count by Decade",
                       template="plotly_white")
         fig.update_layout(xaxis_title="Decade", yaxis_title="Track Count")
         st.plotly_chart(fig, use_container_width=True)
     else:
-        st.warning("🛑 'decade' column missing or no data found.")
+        st.warning("🛑 'year' column missing or no data found.")
 
 # Feature Trends by Decade
-def plot_sound_features_trends(data):
+@timed("exploration.plot_sound_features_trends")
+def plot_sound_features_trends(data, year_data=None):
     st.subheader("Sound Feature Trends Over Decades")
-    sound_features = ['acousticness', 'danceability', 'energy', 'instrumentalness', 'liveness', 'valence']
-    if "decade" not in data.columns or data.empty:
-        st.warning("🛑 Cannot generate trends — missing 'decade' column or data is empty.")
+    cube = get_trend_cube(data, year_data)
+    if cube is None:
+        st.warning("🛑 Cannot generate trends — missing 'year' column or data is empty.")
         return
 
-    for feature in sound_features:
-        if feature in data.columns:
-            trend = data.groupby("decade")[feature].mean().reset_index()
+    trends = cube.trend("decade")
+    for feature in TREND_FEATURES:
+        if feature in cube.features:
+            trend = trends[["decade", feature]]
             fig = px.line(trend, x="decade", y=feature, markers=True,
                           title=f"{feature.capitalize()} Trend by Decade", template="plotly_white")
             fig.update_layout(xaxis_tickangle=0)
@@ -41,6 +193,7 @@ def plot_sound_features_trends(data):
             st.warning(f"🛑 '{feature}' column not found.")
 
 # Top Genres - Feature Comparison
+@timed("exploration.plot_top_genres_trends")
 def plot_top_genres_trends(genre_data):
     st.subheader("Top Genres Sound Features")
     if genre_data.empty or "genres" not in genre_data.columns:
@@ -61,39 +214,31 @@ def plot_top_genres_trends(genre_data):
             st.warning(f"🛑 '{feature}' column not found.")
 
 # Genre Word Cloud
+@timed("exploration.generate_genre_wordcloud")
 def generate_genre_wordcloud(genre_data):
     st.subheader("Genre Word Cloud")
     if "genres" in genre_data.columns:
-        text = ' '.join(genre_data["genres"].dropna().astype(str).tolist())
-        wordcloud = WordCloud(width=800, height=400, background_color="white", max_words=40).generate(text)
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.imshow(wordcloud, interpolation="bilinear")
-        ax.axis("off")
-        ax.set_title("Genres Distribution")
-        st.pyplot(fig)
+        st.image(wordcloud_image(genre_data, "genres", genre_frequencies), caption="Genres Distribution",
+                 use_column_width=True)
     else:
         st.warning("🛑 'genres' column missing.")
 
 # Artist Word Cloud
+@timed("exploration.generate_artist_wordcloud")
 def generate_artist_wordcloud(data):
     st.subheader("Artist Word Cloud")
     if "artists" in data.columns:
-        text = ' '.join(data["artists"].dropna().astype(str).tolist())
-        wordcloud = WordCloud(width=800, height=400, background_color="white", max_words=40).generate(text)
-        fig, ax = plt.subplots(figsize=(10, 5))
-        ax.imshow(wordcloud, interpolation="bilinear")
-        ax.axis("off")
-        ax.set_title("Artists Distribution")
-        st.pyplot(fig)
+        st.image(wordcloud_image(data, "artists", artist_frequencies), caption="Artists Distribution",
+                 use_column_width=True)
     else:
         st.warning("🛑 'artists' column missing.")
 
 # Top Artists by Track Volume
+@timed("exploration.top_artists_by_song_count")
 def top_artists_by_song_count(data):
     st.subheader("Top Artists by Song Count")
     if "artists" in data.columns:
-        top = data["artists"].value_counts().nlargest(10).reset_index()
-        top.columns = ["Artist", "Song Count"]
+        top = get_artist_rankings(data)["song_count"]
         fig = px.bar(top, x="Artist", y="Song Count", color="Song Count",
                      title="Top 10 Artists by Song Count", template="plotly_white")
         fig.update_layout(xaxis_tickangle=45)
@@ -102,10 +247,11 @@ def top_artists_by_song_count(data):
         st.warning("🛑 'artists' column missing.")
 
 # Top Artists by Popularity
+@timed("exploration.top_artists_by_popularity")
 def top_artists_by_popularity(data):
     st.subheader("Top Artists by Popularity")
     if "artists" in data.columns and "popularity" in data.columns:
-        top = data.groupby("artists")["popularity"].mean().nlargest(10).reset_index()
+        top = get_artist_rankings(data)["popularity"]
         fig = px.bar(top, x="artists", y="popularity", color="popularity",
                      title="Top 10 Artists by Popularity", template="plotly_white")
         fig.update_layout(xaxis_tickangle=45)
@@ -0,0 +1,304 @@
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import process, utils
+
+from instrumentation import record_cache, timed
+from loading import dataset_version, on_dataset_evicted
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Character n-gram size used to narrow title candidates
+NGRAM_SIZE = 3
+
+# Titles reranked with edit distance per query
+SHORTLIST_SIZE = 50
+
+# Number of indexes kept alive at once
+INDEX_CACHE_SIZE = 8
+
+# Process-wide indexes keyed by (kind, dataset version), shared by every session
+_indexes = OrderedDict()
+_build_lock = threading.Lock()
+
+# Split a normalized title into padded character n-grams
+def title_ngrams(text, n=NGRAM_SIZE):
+    padded = f"{' ' * (n - 1)}{text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+# Fuzzy title lookup backed by an n-gram inverted index
+class TitleIndex:
+    """Narrows titles by shared character n-grams, then reranks a shortlist with fuzzywuzzy.
+
+    Scores use the same ``WRatio`` scale as ``process.extractOne`` (0-100).
+    """
+
+    @timed("indexing.TitleIndex.build")
+    def __init__(self, titles):
+        self.titles = pd.unique(pd.Series(titles).dropna().astype(str))
+        normalized = [utils.full_process(title) for title in self.titles]
+
+        grams, owners = [], []
+        self.gram_counts = np.zeros(len(self.titles), dtype=np.int32)
+        for title_id, text in enumerate(normalized):
+            title_grams = title_ngrams(text)
+            self.gram_counts[title_id] = len(title_grams)
+            grams.extend(title_grams)
+            owners.extend([title_id] * len(title_grams))
+
+        # Compressed postings: title ids grouped by n-gram
+        codes, vocabulary = pd.factorize(pd.Series(grams, dtype=object))
+        order = np.argsort(codes, kind="stable")
+        self.postings = np.asarray(owners, dtype=np.int32)[order]
+        bounds = np.searchsorted(codes[order], np.arange(len(vocabulary) + 1))
+        self.vocabulary = {gram: (bounds[i], bounds[i + 1]) for i, gram in enumerate(vocabulary)}
+        logging.info(f"✅ Title index built over {len(self.titles)} titles.")
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _shortlist(self, text, size):
+        query_grams = title_ngrams(text)
+        spans = [self.vocabulary[gram] for gram in query_grams if gram in self.vocabulary]
+        if not spans:
+            return []
+
+        hits = np.concatenate([self.postings[start:end] for start, end in spans])
+        overlap = np.bincount(hits, minlength=len(self.titles))
+        # Jaccard similarity of n-gram sets
+        similarity = overlap / (self.gram_counts + len(query_grams) - overlap)
+        candidates = np.flatnonzero(overlap)
+        if len(candidates) > size:
+            candidates = candidates[np.argpartition(-similarity[candidates], size - 1)[:size]]
+        return self.titles[candidates].tolist()
+
+    @timed("indexing.TitleIndex.suggest")
+    def suggest(self, query, limit=10):
+        """Return up to ``limit`` ``(title, score)`` pairs, best first."""
+        text = utils.full_process(query)
+        if not text:
+            return []
+        shortlist = self._shortlist(text, max(SHORTLIST_SIZE, limit))
+        return process.extractBests(query, shortlist, limit=limit) if shortlist else []
+
+    def best_match(self, query):
+        """Drop-in replacement for ``process.extractOne`` over the indexed titles."""
+        matches = self.suggest(query, limit=1)
+        return matches[0] if matches else None
+
+# Lowercase, trimmed song names used as lookup keys
+def normalize_names(names):
+    return pd.Series(names, copy=False).astype("string").str.strip().str.lower()
+
+# Group row positions by value: (uniques, positions ordered by value code, code boundaries)
+def group_positions(values, sort=False):
+    codes, uniques = pd.factorize(values, sort=sort)
+    # Missing values (code -1) sort first and fall outside every group
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return uniques, order, bounds
+
+# Posting lists: value -> sorted row positions
+def build_postings(values):
+    uniques, order, bounds = group_positions(values)
+    order = order.astype(np.int32)
+    return {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques.tolist())}
+
+# Exact, prefix and word-prefix lookup from song name to row positions
+class NameIndex:
+    """Maps normalized names to row positions of the frame the index was built from.
+
+    Exact lookups are a dict hit; prefix and word-prefix lookups are binary searches
+    over sorted name arrays. Titles shared by several tracks map to all their rows.
+    """
+
+    @timed("indexing.NameIndex.build")
+    def __init__(self, names):
+        uniques, self.order, self.bounds = group_positions(normalize_names(names), sort=True)
+        self.names = np.asarray(uniques, dtype=object)
+        self.ids = {name: name_id for name_id, name in enumerate(self.names)}
+
+        # Sorted suffixes starting at every later word, for "contains word" lookups
+        suffixes, owners = [], []
+        for name_id, name in enumerate(self.names):
+            for i, char in enumerate(name):
+                if char == " " and i + 1 < len(name) and name[i + 1] != " ":
+                    suffixes.append(name[i + 1:])
+                    owners.append(name_id)
+        suffix_order = np.argsort(np.asarray(suffixes, dtype=object), kind="stable")
+        self.suffixes = np.asarray(suffixes, dtype=object)[suffix_order]
+        self.suffix_owners = np.asarray(owners, dtype=np.int64)[suffix_order]
+        logging.info(f"✅ Name index built over {len(self.names)} distinct names.")
+
+    def __len__(self):
+        return len(self.names)
+
+    @timed("indexing.NameIndex.extend")
+    def extend(self, names, offset):
+        """A new index that also maps ``names``, the rows appended at ``offset`` and after.
+
+        Sorted arrays are merged with binary-search inserts instead of re-sorting every name.
+        """
+        keys = normalize_names(names)
+        present = keys.notna().to_numpy()
+        keys = keys[present].to_numpy(dtype=object)
+        positions = offset + np.flatnonzero(present)
+
+        # New distinct names slot in before the first existing name that sorts after them
+        fresh = np.unique(np.array([key for key in pd.unique(keys) if key not in self.ids], dtype=object))
+        inserts = np.searchsorted(self.names, fresh) if len(self.names) else np.zeros(len(fresh), dtype=np.int64)
+        names = np.insert(self.names, inserts, fresh) if len(fresh) else self.names
+        shifted = np.arange(len(self.names)) + np.searchsorted(inserts, np.arange(len(self.names)), side="right")
+
+        # Re-group every row by its new name id; the stable sort keeps positions ascending within a name
+        old_codes = np.repeat(shifted, np.diff(self.bounds))
+        new_codes = np.searchsorted(names, keys) if len(keys) else np.array([], dtype=np.int64)
+        codes = np.concatenate([old_codes, new_codes])
+        rows = np.concatenate([self.order[self.bounds[0]:], positions])
+        order = np.argsort(codes, kind="stable")
+
+        index = NameIndex.__new__(NameIndex)
+        index.names = names
+        index.ids = self.ids if not len(fresh) else dict(zip(names.tolist(), range(len(names))))
+        index.order = rows[order]
+        index.bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+
+        suffixes, owners = [], []
+        for name in fresh:
+            for i, char in enumerate(name):
+                if char == " " and i + 1 < len(name) and name[i + 1] != " ":
+                    suffixes.append(name[i + 1:])
+                    owners.append(index.ids[name])
+        suffix_order = np.argsort(np.asarray(suffixes, dtype=object), kind="stable")
+        suffixes = np.asarray(suffixes, dtype=object)[suffix_order]
+        owners = np.asarray(owners, dtype=np.int64)[suffix_order]
+        slots = np.searchsorted(self.suffixes, suffixes, side="right") if len(self.suffixes) else 0
+        index.suffixes = np.insert(self.suffixes, slots, suffixes)
+        index.suffix_owners = np.insert(shifted[self.suffix_owners], slots, owners)
+        logging.info(f"✅ Name index extended with {len(positions)} rows ({len(fresh)} new names).")
+        return index
+
+    def _positions(self, name_ids):
+        if len(name_ids) == 0:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([self.order[self.bounds[i]:self.bounds[i + 1]] for i in name_ids])
+
+    @staticmethod
+    def _prefix_range(array, prefix):
+        return (np.searchsorted(array, prefix, side="left"),
+                np.searchsorted(array, prefix + "\U0010ffff", side="left"))
+
+    def lookup(self, name):
+        """Row positions of tracks whose normalized name equals ``name``."""
+        name_id = self.ids.get(str(name).strip().lower())
+        return self._positions([] if name_id is None else [name_id])
+
+    @timed("indexing.NameIndex.search")
+    def search(self, text):
+        """Row positions matching ``text``: exact matches, then name prefixes, then word prefixes.
+
+        Falls back to a substring scan over the distinct names when nothing else matches.
+        """
+        text = str(text).strip().lower()
+        if not text or len(self.names) == 0:
+            return np.array([], dtype=np.int64)
+
+        ids = [np.array([self.ids[text]], dtype=np.int64)] if text in self.ids else []
+        low, high = self._prefix_range(self.names, text)
+        ids.append(np.arange(low, high, dtype=np.int64))
+        low, high = self._prefix_range(self.suffixes, text)
+        ids.append(self.suffix_owners[low:high])
+
+        name_ids = pd.unique(np.concatenate(ids))
+        if len(name_ids) == 0:
+            contains = pd.Series(self.names, dtype="string").str.contains(text, regex=False)
+            name_ids = np.flatnonzero(contains.to_numpy(dtype=bool, na_value=False))
+        return self._positions(name_ids)
+
+# Genre and decade posting lists for recommendation filters
+class FilterIndex:
+    """Row positions per genre and per decade; combined filters are sorted-array intersections."""
+
+    @timed("indexing.FilterIndex.build")
+    def __init__(self, data, genre_data=None):
+        self.decades = build_postings(data["decade"]) if "decade" in data.columns else {}
+
+        # Songs take the genre of rows in genre_data with the same name
+        self.genres = {}
+        self.has_genres = (genre_data is not None and "name" in data.columns
+                           and {"name", "genres"}.issubset(genre_data.columns))
+        if self.has_genres:
+            genre_names = genre_data[["name", "genres"]].dropna().astype(str).drop_duplicates()
+            songs = pd.DataFrame({"name": data["name"].astype(str).to_numpy(),
+                                  "position": np.arange(len(data), dtype=np.int32)})
+            tagged = songs.merge(genre_names, on="name", how="inner")
+            for genre, positions in tagged.groupby("genres")["position"]:
+                self.genres[genre] = np.unique(positions.to_numpy())
+        logging.info(f"✅ Filter index built over {len(self.genres)} genres and {len(self.decades)} decades.")
+
+    def select(self, genre=None, decade=None):
+        """Sorted row positions matching every given filter, or None when no filter applies."""
+        postings = []
+        if genre is not None:
+            postings.append(self.genres.get(genre, np.array([], dtype=np.int32)))
+        if decade is not None:
+            postings.append(self.decades.get(decade, np.array([], dtype=np.int32)))
+        if not postings:
+            return None
+
+        # Intersect smallest first so each step shrinks the working set fastest
+        postings.sort(key=len)
+        selected = postings[0]
+        for other in postings[1:]:
+            selected = np.intersect1d(selected, other, assume_unique=True)
+        return selected
+
+# Build an index once per (kind, dataset versions)
+def _get_index(kind, data, build, related=None):
+    key = (kind, dataset_version(data), None if related is None else dataset_version(related))
+    with _build_lock:
+        record_cache(f"{kind}_index", key in _indexes)
+        if key not in _indexes:
+            _indexes[key] = build(data)
+            while len(_indexes) > INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(key)
+        return _indexes[key]
+
+# Drop the indexes of a frame the dataset store let go of
+@on_dataset_evicted
+def _release_indexes(name, data):
+    version = dataset_version(data)
+    with _build_lock:
+        for key in [key for key in _indexes if version in key[1:]]:
+            del _indexes[key]
+
+# Title index for a dataset, built once per dataset version
+def get_title_index(data):
+    if data is None or "name" not in data.columns:
+        return TitleIndex([])
+    return _get_index("title", data, lambda df: TitleIndex(df["name"]))
+
+# Name index for a dataset, built once per dataset version
+def get_name_index(data):
+    if data is None or "name" not in data.columns:
+        return NameIndex([])
+    return _get_index("name", data, lambda df: NameIndex(df["name"]))
+
+# Name index for `data`, whose leading rows are `previous`, extended from the index of `previous`
+def extend_name_index(previous, data):
+    base = get_name_index(previous)
+    index = base.extend(data["name"].iloc[len(previous):], len(previous))
+    key = ("name", dataset_version(data), None)
+    with _build_lock:
+        _indexes[key] = index
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+# Filter index for a dataset and its genre table, built once per dataset version
+def get_filter_index(data, genre_data=None):
+    return _get_index("filters", data, lambda df: FilterIndex(df, genre_data), related=genre_data)
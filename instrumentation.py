@@ -0,0 +1,188 @@
+import os
+import time
+import logging
+import threading
+import functools
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Latency histogram bucket bounds in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# When set, the Streamlit app rewrites this file with the Prometheus text after each run
+METRICS_FILE = os.getenv("MUZIKIREC_METRICS_FILE")
+
+METRIC_PREFIX = "muzikirec"
+
+# Per-stage latency histogram
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = np.zeros(len(buckets) + 1, dtype=np.int64)
+        self.sum = 0.0
+        self.max = 0.0
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def observe(self, seconds):
+        self.counts[np.searchsorted(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th observation (an estimate, as in Prometheus)."""
+        if self.count == 0:
+            return float("nan")
+        bucket = int(np.searchsorted(np.cumsum(self.counts), q * self.count))
+        return min(self.buckets[bucket], self.max) if bucket < len(self.buckets) else self.max
+
+# Process-wide registry shared by every session, worker thread and API request
+class Registry:
+    """Latency histograms and labelled counters, safe to update from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(Histogram)
+        self.counters = defaultdict(float)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] += value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {stage: (h.buckets, h.counts.copy(), h.sum, h.max) for stage, h in self.histograms.items()}
+            return histograms, dict(self.counters)
+
+registry = Registry()
+
+# Count an event, e.g. count("spotify_calls", method="search")
+def count(name, value=1, **labels):
+    registry.increment(name, value, **labels)
+
+# Record a cache lookup outcome
+def record_cache(cache, hit):
+    registry.increment("cache_requests", cache=cache, result="hit" if hit else "miss")
+
+# Rows handled by a call: the first DataFrame argument, else the DataFrame(s) returned
+def _rows_processed(args, result):
+    for arg in args:
+        if isinstance(arg, pd.DataFrame):
+            return len(arg)
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, tuple):
+        return sum(len(item) for item in result if isinstance(item, pd.DataFrame))
+    return None
+
+# Decorator recording latency, call count and rows processed for a stage
+def timed(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                registry.increment("stage_errors", stage=stage)
+                raise
+            finally:
+                registry.observe(stage, time.perf_counter() - started)
+            rows = _rows_processed(args, result)
+            if rows:
+                registry.increment("rows_processed", rows, stage=stage)
+            return result
+        return wrapper
+    return decorator
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}" if labels else ""
+
+# All metrics in the Prometheus text exposition format
+def render_prometheus():
+    histograms, counters = registry.snapshot()
+
+    name = f"{METRIC_PREFIX}_stage_duration_seconds"
+    lines = [f"# HELP {name} Latency of instrumented stages.", f"# TYPE {name} histogram"]
+    for stage, (buckets, counts, total, _) in sorted(histograms.items()):
+        cumulative = np.cumsum(counts)
+        for bound, value in zip([*buckets, "+Inf"], cumulative):
+            lines.append(f'{name}_bucket{{stage="{_escape(stage)}",le="{bound}"}} {value}')
+        lines.append(f'{name}_sum{{stage="{_escape(stage)}"}} {total}')
+        lines.append(f'{name}_count{{stage="{_escape(stage)}"}} {cumulative[-1]}')
+
+    for counter in sorted({key[0] for key in counters}):
+        name = f"{METRIC_PREFIX}_{counter}_total"
+        lines.extend([f"# HELP {name} Count of {counter.replace('_', ' ')}.", f"# TYPE {name} counter"])
+        for (key, labels), value in sorted(counters.items()):
+            if key == counter:
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+# Write the Prometheus text to a file, e.g. for node_exporter's textfile collector
+def dump_metrics(path=METRICS_FILE):
+    if not path:
+        return
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as handle:
+            handle.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.warning(f"⚠️ Could not write metrics to {path}: {e}")
+
+# Per-stage latency summary
+def stage_summary():
+    histograms, _ = registry.snapshot()
+    rows = []
+    for stage, (buckets, counts, total, longest) in sorted(histograms.items()):
+        histogram = Histogram(buckets)
+        histogram.counts, histogram.sum, histogram.max = counts, total, longest
+        calls = histogram.count
+        rows.append({
+            "stage": stage,
+            "calls": calls,
+            "mean_ms": round(1000 * total / calls, 2) if calls else 0.0,
+            "p50_ms": round(1000 * histogram.quantile(0.5), 2),
+            "p95_ms": round(1000 * histogram.quantile(0.95), 2),
+            "max_ms": round(1000 * longest, 2),
+            "total_s": round(total, 3),
+        })
+    return pd.DataFrame(rows, columns=["stage", "calls", "mean_ms", "p50_ms", "p95_ms", "max_ms", "total_s"])
+
+# Counter values as a table
+def counter_summary():
+    _, counters = registry.snapshot()
+    rows = [{"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+            for (name, labels), value in sorted(counters.items())]
+    return pd.DataFrame(rows, columns=["metric", "labels", "value"])
+
+# In-app debug panel with stage latencies and counters
+def metrics_panel():
+    with st.expander("🛠 Debug metrics", expanded=True):
+        st.caption("Process-wide since start-up; latency quantiles are histogram bucket bounds.")
+        st.dataframe(stage_summary(), use_container_width=True, hide_index=True)
+        st.dataframe(counter_summary(), use_container_width=True, hide_index=True)
+        st.download_button("Download Prometheus metrics", render_prometheus(), file_name="muzikirec.prom")
@@ -1,12 +1,121 @@
 import pandas as pd
 import os
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict, defaultdict
 import numpy as np
 import logging
+import pyarrow as pa
+import pyarrow.feather as feather
 import streamlit as st
 
+from instrumentation import record_cache, timed
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+# Compiled dataset cache, keyed by a hash of each source CSV
+CACHE_DIR = "datasets/.cache"
+
+# Bump when preprocessing changes so stale caches are rebuilt
+CACHE_FORMAT_VERSION = 4
+
+# String columns whose case is meaningful, e.g. base62 Spotify track IDs
+CASE_SENSITIVE_COLUMNS = ["id"]
+
+# String columns with fewer distinct values than this share of rows become categorical
+CATEGORY_RATIO = 0.5
+
+# Sound features used for similarity and clustering
+SOUND_FEATURES = ["valence", "energy", "danceability", "acousticness"]
+
+# Suffix of the imputed, min-max scaled copies of the sound features
+SCALED_SUFFIX = "_scaled"
+
+# Catalogs at least this large (in MB) are ingested in chunks instead of read whole
+STREAM_THRESHOLD_MB = float(os.getenv("MUZIKIREC_STREAM_THRESHOLD_MB", "1024"))
+
+# Rows parsed per chunk when streaming a catalog
+STREAM_CHUNK_SIZE = 250_000
+
+# Columns kept besides the sound features when streaming; the rest of the CSV is never parsed
+STREAM_METADATA_COLUMNS = ["id", "name", "artists", "year", "popularity"]
+
+# Streamed catalogs, keyed by (path, size, mtime) so the source is hashed once per change
+_streamed = {}
+
+# Memory (MB) the process-wide dataset store may hold before dropping least recently used datasets
+DATASET_MEMORY_BUDGET_MB = float(os.getenv("MUZIKIREC_MEMORY_BUDGET_MB", "4096"))
+
+# Dataset versions, remembered per loaded frame
+_versions = {}
+
+# Stable content version of a loaded dataset, used to key derived indexes
+def dataset_version(data, version=None):
+    entry = _versions.get(id(data))
+    if version is None and entry is not None and entry[0]() is data:
+        return entry[1]
+
+    if version is None:
+        hashed = pd.util.hash_pandas_object(data, index=True).to_numpy()
+        version = hashlib.sha1(hashed.tobytes()).hexdigest()[:16]
+    key = id(data)
+    _versions[key] = (weakref.ref(data, lambda _: _versions.pop(key, None)), version)
+    return version
+
+# Content hash of a source file
+def file_fingerprint(path, chunk_size=1 << 20):
+    digest = hashlib.sha1(f"v{CACHE_FORMAT_VERSION}".encode())
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+# Location of a dataset's compiled cache; `kind` separates the base table from sidecars
+def cache_path(path, fingerprint, kind="base"):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}.{kind}-{fingerprint}.feather")
+
+# Keep Arrow strings Arrow-backed instead of materializing Python objects
+def _arrow_string_mapper(arrow_type):
+    if arrow_type in (pa.string(), pa.large_string()):
+        return pd.StringDtype("pyarrow")
+    return None
+
+# Load a compiled dataset, memory-mapped, or None when no valid cache exists
+def read_cached_dataset(path, fingerprint, kind="base"):
+    cached = cache_path(path, fingerprint, kind)
+    if not os.path.exists(cached):
+        return None
+    try:
+        table = feather.read_table(cached, memory_map=True)
+        # One block per column lets null-free numeric columns stay zero-copy views
+        return table.to_pandas(split_blocks=True, types_mapper=_arrow_string_mapper)
+    except Exception as e:
+        logging.warning(f"⚠️ Ignoring unreadable cache {cached}: {e}")
+        return None
+
+# Write a preprocessed dataset to the compiled cache and drop stale versions
+def write_cached_dataset(df, path, fingerprint, kind="base"):
+    cached = cache_path(path, fingerprint, kind)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cached}.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+        os.replace(tmp_path, cached)
+        remove_stale_caches(stem, kind, cached)
+        logging.info(f"✅ Cached {path} as {cached}.")
+    except Exception as e:
+        logging.warning(f"⚠️ Could not write dataset cache for {path}: {e}")
+
+# Remove other versions of a cache file once a new one is in place
+def remove_stale_caches(stem, kind, keep):
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(f"{stem}.{kind}-") and not entry.endswith(".tmp") and entry != os.path.basename(keep):
+            os.remove(os.path.join(CACHE_DIR, entry))
+
 # Normalize string columns
 def convert_non_numeric_to_string(data):
     if data is None:
@@ -15,13 +124,61 @@ def convert_non_numeric_to_string(data):
 
     non_numeric_cols = data.select_dtypes(exclude=[np.number]).columns
     for col in non_numeric_cols:
-        data[col] = data[col].astype(str).str.lower()
+        if col in CASE_SENSITIVE_COLUMNS:
+            data[col] = data[col].astype(str)
+        else:
+            data[col] = data[col].astype(str).str.lower()
 
     logging.info("✅ Non-numeric columns converted to lowercase strings.")
     return data
 
+# Decade of each year, e.g. 1987 -> 1980
+def compute_decade(year):
+    year = pd.to_numeric(year, errors="coerce")
+    return ((year // 10) * 10).astype("Int64")
+
+# Shrink a dataset to a compact schema: categorical or Arrow strings, float32, small ints
+def optimize_dtypes(df):
+    if df is None:
+        return df
+
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_float_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="float")
+        elif pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                continue
+            if series.nunique(dropna=True) < CATEGORY_RATIO * len(series):
+                df[col] = series.astype("category")
+            else:
+                df[col] = series.astype("string[pyarrow]")
+    return df
+
+# In-memory size of a dataset in megabytes
+def memory_footprint(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20 if df is not None else 0.0
+
+# Per-dataset memory report, so footprint regressions are visible
+def memory_report(datasets):
+    rows = []
+    for name, df in datasets.items():
+        if df is None:
+            continue
+        size_mb = memory_footprint(df)
+        rows.append({
+            "dataset": name,
+            "rows": len(df),
+            "columns": df.shape[1],
+            "memory_mb": round(size_mb, 2),
+            "bytes_per_row": round(size_mb * 2 ** 20 / max(len(df), 1), 1),
+        })
+    return pd.DataFrame(rows)
+
 # Add decade column
-@st.cache_data
+@timed("loading.create_decade_column")
 def create_decade_column(data):
     if data is None:
         logging.error("⚠️ No data provided for decade creation.")
@@ -31,48 +188,395 @@ def create_decade_column(data):
         logging.error("⚠️ Year column missing in dataset.")
         return data
 
-    data["decade"] = data["year"].apply(lambda x: (x // 10) * 10 if pd.notnull(x) else np.nan).astype("Int64")
-    data.to_csv("datasets/data.csv", index=False)
-    logging.info("✅ Decade column added and saved.")
+    data["decade"] = compute_decade(data["year"])
+    logging.info("✅ Decade column added.")
     return data
 
-# Load and preprocess datasets
-@st.cache_data
-def import_data():
-    paths = {
-        "Data": "datasets/data.csv",
-        "Genre Data": "datasets/data_by_genres.csv",
-        "Year Data": "datasets/data_by_year.csv",
-        "Artist Data": "datasets/data_by_artist.csv"
-    }
+# Columns derived from the raw catalog: decade and scaled sound features
+@timed("loading.derive_columns")
+def derive_columns(data):
+    derived = pd.DataFrame(index=data.index)
+    if "year" in data.columns:
+        derived["decade"] = compute_decade(data["year"])
 
-    datasets = {}
+    features = [col for col in SOUND_FEATURES if col in data.columns]
+    if features:
+        # Mean-impute, then min-max scale, matching the clustering preprocessing
+        values = data[features].to_numpy(dtype=np.float64, na_value=np.nan)
+        means = np.nan_to_num(np.nanmean(values, axis=0)) if len(values) else np.zeros(len(features))
+        values = np.where(np.isnan(values), means, values)
+        low = values.min(axis=0) if len(values) else means
+        span = (values.max(axis=0) - low) if len(values) else np.ones(len(features))
+        span[span == 0] = 1.0
+        scaled = ((values - low) / span).astype(np.float32)
+        for i, col in enumerate(features):
+            derived[f"{col}{SCALED_SUFFIX}"] = scaled[:, i]
+    return derived
 
-    for name, path in paths.items():
-        if not os.path.exists(path):
-            logging.warning(f"⚠️ {name} file not found at {path}.")
-            datasets[name] = None
-            continue
+# Derived columns for a dataset, read from the sidecar store or computed and saved there
+def load_derived_columns(df, path, fingerprint):
+    derived = read_cached_dataset(path, fingerprint, kind="derived")
+    record_cache("derived_columns", derived is not None and len(derived) == len(df))
+    if derived is None or len(derived) != len(df):
+        derived = optimize_dtypes(derive_columns(df))
+        write_cached_dataset(derived, path, fingerprint, kind="derived")
+    derived.index = df.index
+    return derived
+
+# Location of a streamed catalog's feature matrix: sound features, then their scaled copies
+def features_path(path, fingerprint):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}.features-{fingerprint}.npy")
+
+# One normalized chunk of a streamed catalog: metadata with decade, and its float32 sound features
+def _prepare_chunk(chunk, metadata_columns):
+    metadata = chunk[metadata_columns].copy()
+    for col in ("year", "popularity"):
+        if col in metadata.columns:
+            metadata[col] = pd.to_numeric(metadata[col], errors="coerce").round().astype("Int32")
+    metadata = convert_non_numeric_to_string(metadata)
+    if "year" in metadata.columns:
+        metadata["decade"] = compute_decade(metadata["year"])
+    features = chunk.reindex(columns=SOUND_FEATURES).apply(pd.to_numeric, errors="coerce")
+    return metadata, features.to_numpy(dtype=np.float32, na_value=np.nan)
+
+# Arrow schema of the metadata table, fixed up front so every chunk appends to one file
+def _metadata_schema(metadata_columns):
+    fields = []
+    for col in metadata_columns:
+        fields.append(pa.field(col, pa.int32() if col in ("year", "popularity") else pa.string()))
+    if "year" in metadata_columns:
+        fields.append(pa.field("decade", pa.int32()))
+    return pa.schema(fields)
+
+# Read a catalog CSV chunk by chunk into a slim metadata table and an on-disk feature matrix
+@timed("loading.ingest_streamed_dataset")
+def ingest_streamed_dataset(path, fingerprint, chunk_size=STREAM_CHUNK_SIZE):
+    header = pd.read_csv(path, nrows=0).columns
+    metadata_columns = [col for col in STREAM_METADATA_COLUMNS if col in header]
+    usecols = metadata_columns + [col for col in SOUND_FEATURES if col in header]
+    schema = _metadata_schema(metadata_columns)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    metadata_path, matrix_path = cache_path(path, fingerprint, "stream"), features_path(path, fingerprint)
+    raw_path = f"{matrix_path}.raw.tmp"
+    width = len(SOUND_FEATURES)
+    rows, sums, counts = 0, np.zeros(width), np.zeros(width)
+    low, high = np.full(width, np.inf), np.full(width, -np.inf)
+
+    # Pass 1: normalize each chunk, append its metadata and raw features, and track feature statistics
+    with pa.OSFile(f"{metadata_path}.tmp", "wb") as sink, pa.ipc.new_file(sink, schema) as writer, \
+            open(raw_path, "wb") as raw:
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunk_size, on_bad_lines="warn"):
+            metadata, values = _prepare_chunk(chunk, metadata_columns)
+            writer.write_table(pa.Table.from_pandas(metadata, schema=schema, preserve_index=False))
+            raw.write(np.ascontiguousarray(values).tobytes())
+
+            present = ~np.isnan(values)
+            sums += np.where(present, values, 0).sum(axis=0)
+            counts += present.sum(axis=0)
+            if len(values):
+                low = np.minimum(low, np.where(present, values, np.inf).min(axis=0))
+                high = np.maximum(high, np.where(present, values, -np.inf).max(axis=0))
+            rows += len(values)
+            logging.info(f"Ingested {rows} rows of {path}.")
+
+    if rows == 0:
+        os.remove(raw_path)
+        os.remove(f"{metadata_path}.tmp")
+        raise ValueError(f"{path} has no rows.")
+
+    # Pass 2: copy the features into the final matrix next to their imputed, min-max scaled copies,
+    # matching derive_columns
+    means = np.divide(sums, counts, out=np.zeros(width), where=counts > 0)
+    low = np.where(counts > 0, low, means)
+    span = np.where(counts > 0, high, means) - low
+    span[span == 0] = 1.0
+    raw_matrix = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(rows, width))
+    matrix = np.lib.format.open_memmap(f"{matrix_path}.tmp", mode="w+", dtype=np.float32, shape=(rows, 2 * width))
+    for start in range(0, rows, chunk_size):
+        block = np.asarray(raw_matrix[start:start + chunk_size])
+        matrix[start:start + len(block), :width] = block
+        imputed = np.where(np.isnan(block), means, block)
+        matrix[start:start + len(block), width:] = (imputed - low) / span
+    matrix.flush()
+    del matrix, raw_matrix
+
+    os.replace(f"{matrix_path}.tmp", matrix_path)
+    os.replace(f"{metadata_path}.tmp", metadata_path)
+    os.remove(raw_path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    remove_stale_caches(stem, "features", matrix_path)
+    remove_stale_caches(stem, "stream", metadata_path)
+    logging.info(f"✅ Streamed {rows} rows of {path} into {matrix_path}.")
 
+# A streamed catalog as a DataFrame whose feature columns are read-only views of the memory-mapped matrix
+def read_streamed_dataset(path, fingerprint):
+    metadata = read_cached_dataset(path, fingerprint, kind="stream")
+    matrix_path = features_path(path, fingerprint)
+    if metadata is None or not os.path.exists(matrix_path):
+        return None
+    matrix = np.load(matrix_path, mmap_mode="r")
+    if len(matrix) != len(metadata):
+        logging.warning(f"⚠️ Ignoring {matrix_path}: {len(matrix)} rows for {len(metadata)} tracks.")
+        return None
+
+    if "decade" in metadata.columns:
+        metadata["decade"] = metadata["decade"].astype("Int64")
+    columns = [*SOUND_FEATURES, *(f"{col}{SCALED_SUFFIX}" for col in SOUND_FEATURES)]
+    features = pd.DataFrame(matrix, columns=columns, copy=False)
+    return pd.concat([metadata, features], axis=1, copy=False)
+
+# Load a large catalog out of core: ingest it once in chunks, then memory-map the result
+@timed("loading.stream_dataset")
+def stream_dataset(path, chunk_size=STREAM_CHUNK_SIZE):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    record_cache("streamed_dataset", key in _streamed)
+    if key not in _streamed:
+        fingerprint = file_fingerprint(path)
+        df = read_streamed_dataset(path, fingerprint)
+        record_cache("dataset_file", df is not None)
+        if df is None:
+            ingest_streamed_dataset(path, fingerprint, chunk_size)
+            df = read_streamed_dataset(path, fingerprint)
+        dataset_version(df, fingerprint)
+        logging.info(f"📦 {path}: {len(df)} rows streamed, {memory_footprint(df):.1f} MB mapped.")
+        _streamed.clear()
+        _streamed[key] = df
+    return _streamed[key]
+
+# Source file of each dataset
+DATASET_PATHS = {
+    "Data": "datasets/data.csv",
+    "Genre Data": "datasets/data_by_genres.csv",
+    "Year Data": "datasets/data_by_year.csv",
+    "Artist Data": "datasets/data_by_artist.csv"
+}
+
+# Load one dataset, so each page only pays for the tables it shows; big catalogs are streamed
+def load_dataset(name):
+    path = DATASET_PATHS[name]
+    if name == "Data" and os.path.exists(path) and os.path.getsize(path) >= STREAM_THRESHOLD_MB * 2 ** 20:
         try:
-            df = pd.read_csv(path, on_bad_lines="warn")
+            return stream_dataset(path)
+        except Exception as e:
+            logging.error(f"❌ Error streaming {name}: {e}")
+            return None
+    return read_dataset(name)
+
+# Read and preprocess one dataset in memory
+@timed("loading.read_dataset")
+def read_dataset(name):
+    path = DATASET_PATHS[name]
+    if not os.path.exists(path):
+        logging.warning(f"⚠️ {name} file not found at {path}.")
+        return None
+
+    try:
+        fingerprint = file_fingerprint(path)
+        df = read_cached_dataset(path, fingerprint)
+        record_cache("dataset_file", df is not None)
+
+        if df is None:
+            df = timed("loading.read_csv")(pd.read_csv)(path, on_bad_lines="warn")
 
             if df.empty:
                 logging.warning(f"⚠️ {name} is empty.")
-                datasets[name] = None
-                continue
+                return None
 
             if name == "Data":
-                df = create_decade_column(df)
                 df = convert_non_numeric_to_string(df)
 
-            datasets[name] = df
+            df = optimize_dtypes(df)
+            write_cached_dataset(df, path, fingerprint)
+        else:
+            logging.info(f"✅ {name} loaded from cache.")
 
-        except Exception as e:
-            logging.error(f"❌ Error loading {name}: {e}")
-            datasets[name] = None
+        # Derived columns live in a sidecar store; the source CSV is never rewritten
+        if name == "Data":
+            derived = load_derived_columns(df, path, fingerprint)
+            for col in derived.columns:
+                df[col] = derived[col]
+
+        dataset_version(df, fingerprint)
+        logging.info(f"📦 {name}: {len(df)} rows, {memory_footprint(df):.1f} MB in memory.")
+        return df
+
+    except Exception as e:
+        logging.error(f"❌ Error loading {name}: {e}")
+        return None
+
+# Size and modification time of a dataset's source file, or None when it is missing
+def source_stat(name):
+    try:
+        stat = os.stat(DATASET_PATHS[name])
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+# Append normalized rows to a loaded dataset as a new frame, keeping its column dtypes
+@timed("loading.append_rows")
+def append_rows(data, rows):
+    rows = rows.reindex(columns=data.columns)
+    columns = {}
+    for col in data.columns:
+        old, new = data[col].reset_index(drop=True), rows[col].reset_index(drop=True)
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            # Unseen values become new trailing categories, so the existing codes stay valid as they are
+            categories = old.cat.categories
+            fresh = pd.Index(new.dropna().unique()).difference(categories)
+            dtype = pd.CategoricalDtype(categories.append(fresh), ordered=old.cat.ordered)
+            codes = np.concatenate([old.cat.codes.to_numpy(), dtype.categories.get_indexer(new)])
+            columns[col] = pd.Series(pd.Categorical.from_codes(codes, dtype=dtype, validate=False))
+            continue
+        if pd.api.types.is_numeric_dtype(old.dtype):
+            new = pd.to_numeric(new, errors="coerce")
+        try:
+            new = new.astype(old.dtype)
+        except (TypeError, ValueError):
+            # e.g. missing values appended to an integer column; concat widens the dtype
+            pass
+        columns[col] = pd.concat([old, new], ignore_index=True)
+    return pd.DataFrame(columns)
+
+# Callbacks run with (name, frame) once the store drops or replaces a frame
+_eviction_hooks = []
+
+# Register a hook that releases whatever a module cached for an evicted frame, so its memory is freed
+def on_dataset_evicted(hook):
+    _eviction_hooks.append(hook)
+    return hook
+
+# The streamed catalog cache holds the frame too
+@on_dataset_evicted
+def _release_streamed(name, df):
+    for key in [key for key, frame in _streamed.items() if frame is df]:
+        del _streamed[key]
+
+# Read-only datasets shared by every session, thread and request in the process
+class DatasetStore:
+    """Loads each dataset once per process and hands the same frame to every caller.
 
-    return datasets.get("Data"), datasets.get("Genre Data"), datasets.get("Year Data"), datasets.get("Artist Data")
+    Frames are shared, so callers must not modify them in place. When the held
+    datasets exceed ``budget_mb``, the least recently used ones are dropped and
+    reloaded (from the on-disk cache) on next use. A dataset whose source file
+    changed, e.g. after ``updates.py`` appended tracks, is reloaded too. Dropped
+    and replaced frames are passed to the ``on_dataset_evicted`` hooks, so the
+    indexes built from them do not keep them alive.
+    """
+
+    def __init__(self, budget_mb=DATASET_MEMORY_BUDGET_MB):
+        self.budget_mb = budget_mb
+        self._datasets = OrderedDict()
+        self._sizes = {}
+        self._sources = {}
+        self._lock = threading.Lock()
+        # One loader per dataset at a time; other datasets stay available meanwhile
+        self._load_locks = defaultdict(threading.Lock)
+
+    def _current(self, name):
+        # Held frame, if any and still matching its source file
+        if name in self._datasets and self._sources.get(name) == source_stat(name):
+            self._datasets.move_to_end(name)
+            return True
+        return False
+
+    def get(self, name):
+        with self._lock:
+            if self._current(name):
+                record_cache("dataset_store", True)
+                return self._datasets[name]
+            load_lock = self._load_locks[name]
+
+        with load_lock:
+            with self._lock:
+                if self._current(name):
+                    record_cache("dataset_store", True)
+                    return self._datasets[name]
+            record_cache("dataset_store", False)
+            source = source_stat(name)
+            df = load_dataset(name)
+            # Finish the frame before publishing it, so no caller has to add columns
+            if name == "Data" and df is not None and "decade" not in df.columns:
+                df = create_decade_column(df)
+            self.put(name, df, source)
+            return df
+
+    def put(self, name, df, source=None):
+        """Publish ``df`` as the current version of a dataset, e.g. after an incremental update."""
+        with self._lock:
+            replaced = self._datasets.get(name)
+            self._datasets[name] = df
+            self._datasets.move_to_end(name)
+            self._sizes[name] = memory_footprint(df)
+            self._sources[name] = source or source_stat(name)
+            evicted = self._enforce_budget(keep=name)
+        if replaced is not None and replaced is not df:
+            evicted.append((name, replaced))
+        self._release(evicted)
+
+    def _enforce_budget(self, keep):
+        evicted = []
+        while self.memory_mb > self.budget_mb and len(self._datasets) > 1:
+            oldest = next(iter(self._datasets))
+            if oldest == keep:
+                self._datasets.move_to_end(oldest)
+                oldest = next(iter(self._datasets))
+            evicted.append((oldest, self._datasets.pop(oldest)))
+            self._sources.pop(oldest, None)
+            logging.info(f"Dropped {oldest} from the dataset store ({self._sizes.pop(oldest):.1f} MB) "
+                         f"to stay within {self.budget_mb:g} MB.")
+        if self.memory_mb > self.budget_mb:
+            logging.warning(f"⚠️ {keep} alone uses {self.memory_mb:.1f} MB, over the {self.budget_mb:g} MB budget.")
+        return evicted
+
+    @staticmethod
+    def _release(evicted):
+        # Outside the store lock: hooks take their own cache locks
+        for name, df in evicted:
+            if df is None:
+                continue
+            for hook in _eviction_hooks:
+                try:
+                    hook(name, df)
+                except Exception as e:
+                    logging.warning(f"⚠️ Could not release caches for {name}: {e}")
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._datasets
+
+    @property
+    def memory_mb(self):
+        return sum(self._sizes.values())
+
+    def report(self):
+        with self._lock:
+            return memory_report(dict(self._datasets))
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._datasets.items())
+            self._datasets.clear()
+            self._sizes.clear()
+            self._sources.clear()
+        self._release(evicted)
+
+_store = DatasetStore()
+
+# Shared, read-only dataset by name, e.g. get_dataset("Data")
+def get_dataset(name):
+    return _store.get(name)
+
+# The process-wide dataset store
+def dataset_store():
+    return _store
+
+# All four datasets, from the shared store
+@timed("loading.import_data")
+def import_data():
+    return tuple(get_dataset(name) for name in DATASET_PATHS)
 
 #  Standalone preview if run directly
 if __name__ == "__main__":
@@ -86,6 +590,10 @@ if __name__ == "__main__":
     }
 
     st.title("📊 MuzikiRec - Dataset Loader & Structure Overview")
+
+    st.subheader("📦 Memory Footprint")
+    st.dataframe(memory_report(datasets))
+
     selected_dataset = st.sidebar.selectbox("Select Dataset to Preview", list(datasets.keys()))
 
     st.subheader(f"🔍 {selected_dataset} Preview")
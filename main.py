@@ -1,26 +1,11 @@
 import streamlit as st
-import os
 import pandas as pd
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from auth import get_spotify_oauth, authenticate_spotify
 from dotenv import load_dotenv
-from fuzzywuzzy import process
 import logging
 
-# Internal modules
-from loading import import_data, create_decade_column
-from exploration import (
-    visualize_decade_distribution, plot_sound_features_trends,
-    plot_top_genres_trends, generate_genre_wordcloud, generate_artist_wordcloud,
-    top_artists_by_song_count, top_artists_by_popularity
-)
-from clustering import (
-    cluster_genres, visualize_genre_clusters,
-    cluster_songs, visualize_song_clusters
-)
-from model import recommend_songs
-from spotify_utils import create_spotify_playlist
+# Internal modules; page modules (sklearn, plotly, wordcloud, spotipy) are imported by the page that uses them
+from loading import dataset_store
+from instrumentation import dump_metrics, metrics_panel
 
 # Set Streamlit config
 st.set_page_config(page_title="MuzikiRec", layout="wide", page_icon="🎵")
@@ -28,40 +13,29 @@ st.set_page_config(page_title="MuzikiRec", layout="wide", page_icon="🎵")
 # Logging setup
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-# Load credentials
+# Load settings; Spotify credentials are checked when a playlist is first exported
 load_dotenv()
-client_id = os.getenv("SPOTIPY_CLIENT_ID")
-client_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
-redirect_uri = os.getenv("SPOTIPY_REDIRECT_URI")
-
-# Check if credentials are set
-if not all([client_id, client_secret, redirect_uri]):
-    st.error("❌ Spotify credentials missing. Please check your .env file.")
-    raise ValueError("Spotify client ID, secret, and redirect URI are required.")
-
-# Load data once
-if "data" not in st.session_state:
-    st.session_state["data"], st.session_state["genre_data"], st.session_state["year_data"], st.session_state["artist_data"] = import_data()
-
-# Extract datasets
-data = st.session_state["data"]
-genre_data = st.session_state["genre_data"]
-year_data = st.session_state["year_data"]
-artist_data = st.session_state["artist_data"]
-
-# Add decade column if missing
-if data is not None and "decade" not in data.columns:
-    data = create_decade_column(data)
-    st.session_state["data"] = data
-
-# Stop if no data
-if data is None or data.empty:
-    st.error("Data missing or failed to load.")
-    st.stop()
+
+# Datasets come from the process-wide store: one read-only copy shared by every session
+def get_dataset(name):
+    store = dataset_store()
+    if name in store:
+        return store.get(name)
+    with st.spinner(f"Loading {name.lower()}..."):
+        return store.get(name)
+
+# Song data, stopping the page if it is missing
+def get_song_data():
+    data = get_dataset("Data")
+    if data is None or data.empty:
+        st.error("Data missing or failed to load.")
+        st.stop()
+    return data
 
 # Sidebar Navigation
 st.sidebar.title("🎶 MuzikiRec")
 menu = st.sidebar.selectbox("Navigate", ["Home", "Explore Trends", "Clustering", "Get Recommendations"])
+show_metrics = st.sidebar.checkbox("Show debug metrics", value=False)
 
 # Home Page
 if menu == "Home":
@@ -70,12 +44,19 @@ if menu == "Home":
     st.caption("Data powered by MuzikiRec ✨")
 
     st.subheader("Dataset Preview")
+    data = get_song_data()
     selected_cols = st.multiselect("Select Columns to View", data.columns.tolist(), default=data.columns.tolist()[:5])
     st.dataframe(data[selected_cols].head(20))
     st.metric("Total Songs", len(data))
 
 # Explore Trends
 elif menu == "Explore Trends":
+    from exploration import (
+        visualize_decade_distribution, plot_sound_features_trends,
+        plot_top_genres_trends, generate_genre_wordcloud, generate_artist_wordcloud,
+        top_artists_by_song_count, top_artists_by_popularity
+    )
+
     st.header("📈 Explore Musical Trends")
     selected_visual = st.selectbox("Choose a visualization:", [
         "Decade Distribution", "Sound Features Trends", "Loudness Trend",
@@ -84,29 +65,37 @@ elif menu == "Explore Trends":
     ])
 
     if selected_visual == "Decade Distribution":
-        visualize_decade_distribution(data)
+        visualize_decade_distribution(get_song_data(), get_dataset("Year Data"))
     elif selected_visual == "Sound Features Trends":
-        plot_sound_features_trends(data)
+        plot_sound_features_trends(get_song_data(), get_dataset("Year Data"))
     elif selected_visual == "Top Genres Trends":
-        plot_top_genres_trends(genre_data)
+        plot_top_genres_trends(get_dataset("Genre Data"))
     elif selected_visual == "Genre WordCloud":
-        generate_genre_wordcloud(genre_data)
+        generate_genre_wordcloud(get_dataset("Genre Data"))
     elif selected_visual == "Artist WordCloud":
-        generate_artist_wordcloud(artist_data)
+        generate_artist_wordcloud(get_dataset("Artist Data"))
     elif selected_visual == "Top Artists by Song Count":
-        top_artists_by_song_count(artist_data)
+        top_artists_by_song_count(get_dataset("Artist Data"))
     elif selected_visual == "Top Artists by Popularity":
-        top_artists_by_popularity(artist_data)
+        top_artists_by_popularity(get_dataset("Artist Data"))
 
 # Clustering
 elif menu == "Clustering":
+    from clustering import (
+        cluster_genres, visualize_genre_clusters,
+        cluster_songs, visualize_song_clusters, song_cluster_metrics, RENDER_MODES
+    )
+
     st.header("🎯 Cluster Genres & Songs")
+    data, genre_data = get_song_data(), get_dataset("Genre Data")
 
     st.sidebar.subheader("Genre Clustering")
     genre_cluster_count = st.sidebar.slider("Number of Genre Clusters", min_value=3, max_value=15, value=5, key="genre_clusters")
 
     st.sidebar.subheader("Song Clustering")
     song_cluster_count = st.sidebar.slider("Number of Song Clusters", min_value=5, max_value=30, value=25, key="song_clusters")
+    song_plot_mode = st.sidebar.radio("Song Plot Mode", RENDER_MODES, key="song_plot_mode",
+                                      help="'auto' picks SVG, WebGL or a per-cluster sample by point count.")
 
     clustered_genres = cluster_genres(genre_data, n_clusters=genre_cluster_count)
     if clustered_genres is not None:
@@ -114,11 +103,24 @@ elif menu == "Clustering":
 
     clustered_songs = cluster_songs(data, n_clusters=song_cluster_count)
     if clustered_songs is not None:
-        visualize_song_clusters(clustered_songs)
+        visualize_song_clusters(clustered_songs, mode=song_plot_mode)
+
+    with st.expander("Song cluster quality by k"):
+        metrics = song_cluster_metrics(data)
+        if metrics.empty:
+            st.info("The clustering sweep is still running.")
+        else:
+            st.caption(f"Fitted {len(metrics)} cluster counts so far.")
+            st.line_chart(metrics.set_index("k")["inertia"])
+            st.line_chart(metrics.set_index("k")["silhouette"])
 
 # Recommendations
 elif menu == "Get Recommendations":
+    from model import recommend_songs, recommend_for_seeds, SEED_STRATEGIES
+    from indexing import get_title_index, get_name_index, get_filter_index
+
     st.header("🔍 Find Song Recommendations")
+    data, genre_data = get_song_data(), get_dataset("Genre Data")
 
     genre_options = ["All"] + genre_data["genres"].dropna().unique().tolist() if "genres" in genre_data.columns else ["All"]
     decade_options = ["All"] + sorted(data["decade"].dropna().unique().tolist()) if "decade" in data.columns else ["All"]
@@ -130,54 +132,114 @@ elif menu == "Get Recommendations":
 
     if user_input:
         user_song = user_input.strip()
-        match_result = process.extractOne(user_song, data["name"].dropna().tolist())
+        suggestions = get_title_index(data).suggest(user_song, limit=5)
 
-        if match_result:
-            validated_song_name = match_result[0]
+        if suggestions:
+            validated_song_name = st.selectbox("Matching titles", [title for title, _ in suggestions])
             logging.info(f"Validated fuzzy match: '{user_song}' → '{validated_song_name}'")
             st.write(f"Generating recommendations for: {validated_song_name}")
 
-            filtered_data = data.copy()
+            # Filters resolve to row positions from prebuilt posting lists
+            filters = get_filter_index(data, genre_data)
+            genre_choice, decade_choice = None, None
 
-            # Safe merge if columns exist
             if genre_filter != "All":
-                if "name" in genre_data.columns and "genres" in genre_data.columns:
-                    merged = pd.merge(filtered_data, genre_data[["name", "genres"]], on="name", how="left")
-                    filtered_data = merged[merged["genres"] == genre_filter]
+                if filters.has_genres:
+                    genre_choice = genre_filter
                 else:
                     st.warning("Genre data can't be filtered. Missing 'name' or 'genres' columns.")
 
             if decade_filter != "All":
-                if "decade" in filtered_data.columns:
-                    filtered_data = filtered_data[filtered_data["decade"] == decade_filter]
+                if "decade" in data.columns:
+                    decade_choice = decade_filter
                 else:
                     st.warning("Decade column missing in data.")
 
-            recommended_tracks = recommend_songs(validated_song_name, filtered_data)
+            candidates = filters.select(genre=genre_choice, decade=decade_choice)
+            if candidates is not None and len(candidates) == 0:
+                st.warning("No songs match the selected filters.")
+
+            # Let the user disambiguate titles shared by several tracks
+            versions = get_name_index(data).lookup(validated_song_name)
+            seed_position = int(versions[0]) if len(versions) else None
+            if len(versions) > 1 and {"artists", "year"}.issubset(data.columns):
+                labels = [f"{data['artists'].iat[pos]} ({data['year'].iat[pos]})" for pos in versions]
+                # Number repeated artist/year labels, so every version can be told apart and picked
+                labels = [f"{label} #{labels[:i].count(label) + 1}" if labels.count(label) > 1 else label
+                          for i, label in enumerate(labels)]
+                version = st.selectbox(
+                    "Several tracks share this title. Choose one:", versions.tolist(),
+                    format_func=dict(zip(versions.tolist(), labels)).get
+                )
+                seed_position = int(version)
+
+            # Seed songs collected across searches; the current song always counts as one
+            saved_seeds = [pos for pos in st.session_state.setdefault("seed_positions", []) if pos < len(data)]
+            if seed_position is not None and st.button("➕ Add to seed songs") and seed_position not in saved_seeds:
+                saved_seeds.append(seed_position)
+            if saved_seeds:
+                saved_seeds = st.multiselect(
+                    "Seed songs (untick to remove):", saved_seeds, default=saved_seeds,
+                    format_func=lambda pos: f"{data['name'].iat[pos]} — {data['artists'].iat[pos]}"
+                    if "artists" in data.columns else data["name"].iat[pos]
+                )
+            st.session_state["seed_positions"] = saved_seeds
+            seeds = list(dict.fromkeys(saved_seeds + ([seed_position] if seed_position is not None else [])))
+
+            if len(seeds) > 1:
+                strategy = st.radio(
+                    "Blend seeds by", SEED_STRATEGIES, horizontal=True,
+                    help="centroid: close to the seeds' average sound · max: close to any one seed · "
+                         "quota: an equal share of neighbours per seed"
+                )
+                recommended_tracks = recommend_for_seeds(seeds, data, strategy=strategy, candidates=candidates)
+            else:
+                # The chosen row itself, so versions sharing an artist and year stay reachable
+                recommended_tracks = recommend_songs(
+                    validated_song_name, data, position=seed_position, candidates=candidates
+                )
 
             if recommended_tracks is not None and not recommended_tracks.empty:
                 st.write("### Recommended Songs")
+                track_labels = [
+                    f"{row.name} — {row.artists}" if "artists" in recommended_tracks.columns else row.name
+                    for row in recommended_tracks.itertuples(index=False)
+                ]
+                # Keyed by the recommended tracks, so selections never carry over to another seed's results
+                track_keys = (recommended_tracks["id"] if "id" in recommended_tracks.columns
+                              else recommended_tracks.index).astype(str)
                 selected_songs = st.multiselect(
                     "Select songs for your playlist:",
-                    recommended_tracks["name"].tolist(),
-                    default=recommended_tracks["name"].tolist()
+                    list(range(len(recommended_tracks))),
+                    default=list(range(len(recommended_tracks))),
+                    format_func=lambda i: track_labels[i],
+                    key=f"playlist_songs_{hash(tuple(track_keys))}"
                 )
 
                 playlist_name = st.text_input("Enter Playlist Name", "My MuzikiRec Playlist")
 
                 if st.button("Generate Playlist") and selected_songs:
-                    if "spotify" not in st.session_state:
-                        authenticate_spotify()
+                    from auth import authenticate_spotify
+                    from spotify_utils import call_with_backoff, create_spotify_playlist
 
-                    spotify_client = st.session_state.get("spotify")
+                    # Built on the first export of the session, then reused by every later one
+                    spotify_client = authenticate_spotify()
 
                     if spotify_client:
-                        user_id = spotify_client.current_user()["id"]
+                        if "spotify_user_id" not in st.session_state:
+                            st.session_state.spotify_user_id = call_with_backoff(spotify_client.current_user)["id"]
                         result = create_spotify_playlist(
                             spotify_client=spotify_client,
-                            user_id=user_id,
+                            user_id=st.session_state.spotify_user_id,
                             playlist_name=playlist_name,
-                            song_names=selected_songs
+                            tracks=[
+                                {
+                                    "song": recommended_tracks["name"].iat[i],
+                                    "artist": recommended_tracks["artists"].iat[i] if "artists" in recommended_tracks.columns else None,
+                                    "id": recommended_tracks["id"].iat[i] if "id" in recommended_tracks.columns else None,
+                                }
+                                for i in selected_songs
+                            ]
                         )
 
                         if result["success"]:
@@ -185,9 +247,20 @@ elif menu == "Get Recommendations":
                                 f"Playlist '{result['name']}' created with {result['track_count']} track(s)! 🎧 "
                                 f"[Open on Spotify]({result['url']})"
                             )
+                            if result["failed"]:
+                                st.warning(f"⚠️ {len(result['failed'])} song(s) could not be added.")
+                            with st.expander("Per-song status"):
+                                st.dataframe(pd.DataFrame(result["tracks"])[["song", "status"]])
                         else:
                             st.error("⚠️ Playlist creation failed. Try different song selections or re-authenticate.")
                     else:
                         st.error("Spotify client not initialized. Please authenticate.")
         else:
-            st.error(f"No match found for '{user_song}'. Try a different title.")
\ No newline at end of file
+            st.error(f"No match found for '{user_song}'. Try a different title.")
+
+# Debug metrics: in-app panel and optional Prometheus dump file
+if show_metrics:
+    metrics_panel()
+    st.caption(f"Shared datasets: {dataset_store().memory_mb:.1f} of {dataset_store().budget_mb:.0f} MB budget")
+    st.dataframe(dataset_store().report(), use_container_width=True, hide_index=True)
+dump_metrics()
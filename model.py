@@ -1,63 +1,565 @@
 import os
+import atexit
+import copy
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import streamlit as st
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-from dotenv import load_dotenv
-
-# Load credentials
-load_dotenv()
-client_id = os.getenv("SPOTIPY_CLIENT_ID")
-client_secret = os.getenv("SPOTIPY_CLIENT_SECRET")
-redirect_uri = os.getenv("SPOTIPY_REDIRECT_URI")
-
-# Credential check
-if not all([client_id, client_secret, redirect_uri]):
-    st.error("❌ Spotify credentials missing. Please check your .env file.")
-    raise ValueError("Spotify client ID, secret, and redirect URI are required.")
-
-# Initialize Spotify client
-@st.cache_data
-def get_spotify_client():
-    sp_oauth = SpotifyOAuth(client_id, client_secret, redirect_uri, scope="playlist-modify-public")
-    return spotipy.Spotify(auth_manager=sp_oauth)
-
-spotify = get_spotify_client()
-
-# Load dataset
-@st.cache_data
-def load_data():
-    try:
-        df = pd.read_csv("datasets/data.csv")
-        return df.dropna(subset=["valence", "energy", "danceability", "acousticness"])
-    except FileNotFoundError:
-        st.error("❌ 'datasets/data.csv' not found. Please check your file path.")
-        return pd.DataFrame()
+
+from ann import DEFAULT_NPROBE, load_ivf_index
+from indexing import get_name_index, normalize_names
+from instrumentation import count, record_cache, timed
+from loading import CACHE_DIR, SOUND_FEATURES, dataset_version, on_dataset_evicted
+
+# Rows scored per block when ranking a candidate subset
+BLOCK_SIZE = 65536
+
+# Number of feature indexes kept alive at once
+INDEX_CACHE_SIZE = 4
+
+# Ways to combine several seed tracks into one ranking
+SEED_STRATEGIES = ["centroid", "max", "quota"]
+
+# Candidates ranked per requested recommendation before deduplication and diversification
+SEED_POOL_FACTOR = 5
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+# Place feature matrices in named shared memory, so separately started worker processes map one copy
+SHARED_MEMORY = os.getenv("MUZIKIREC_SHARED_MEMORY", "") == "1"
+
+# Seconds an attaching process waits for the creating process to finish filling a segment
+SHARED_MEMORY_WAIT = 30.0
+
+# Bytes before the array in a segment; the first byte is set once the array is filled
+SHARED_HEADER_BYTES = 64
+
+# Tracks appended since the KD-tree was built, as a share of the index, before it is rebuilt
+DELTA_REBUILD_FRACTION = 0.05
+
+# Segments mapped by this process: name -> (segment, creator pid)
+_shared_segments = {}
+
+# Neighbour table written by precompute.py
+NEIGHBOURS_PATH = os.path.join(CACHE_DIR, "neighbours.npz")
+
+_neighbours = {}
+_neighbours_lock = threading.Lock()
+
+# Exact nearest-neighbour index over the sound features
+class SongIndex:
+    """Normalized float32 feature matrix with a KD-tree for exact top-k queries.
+
+    Positions returned by the index are row positions in the frame it was built
+    from, so results can be taken with ``data.iloc`` without copying the frame.
+    Tracks added by ``extend`` are scanned directly until the tree is rebuilt.
+    The KD-tree, which keeps its own float64 copy of the matrix, is only built by
+    the first exact query; IVF serving reads the matrix alone.
+    """
+
+    @timed("model.SongIndex.build")
+    def __init__(self, data, features=None, weights=None):
+        self.features = list(features or SOUND_FEATURES)
+        values = data[self.features].to_numpy(dtype=np.float32, na_value=np.nan)
+        valid = ~np.isnan(values).any(axis=1)
+
+        self.rows = np.flatnonzero(valid)
+        self.slots = np.full(len(data), -1, dtype=np.int64)
+        self.slots[self.rows] = np.arange(len(self.rows))
+
+        matrix = np.ascontiguousarray(values[valid])
+        del values
+        self.low = matrix.min(axis=0) if len(matrix) else np.zeros(len(self.features), dtype=np.float32)
+        self.span = (matrix.max(axis=0) - self.low) if len(matrix) else np.ones(len(self.features), dtype=np.float32)
+        self.span[self.span == 0] = 1.0
+
+        # Weighted euclidean distance == plain euclidean on sqrt(weight)-scaled axes
+        self.weights = weights
+        weights = np.ones(len(self.features)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.scale = np.sqrt(weights).astype(np.float32)
+        # Scaled in place, so building over a memory-mapped catalog holds one float32 copy of the features
+        matrix -= self.low
+        matrix /= self.span
+        matrix *= self.scale
+        self.matrix = self._share(data, matrix)
+        self.max_distance = float(np.sqrt(weights.sum())) or 1.0
+
+        self.popularity_max = 1.0
+        if "popularity" in data.columns:
+            popularity = data["popularity"].to_numpy(dtype=np.float32, na_value=0.0)[self.rows]
+            self.popularity_max = max(float(popularity.max()), 1.0) if len(popularity) else 1.0
+            self.popularity = popularity / self.popularity_max
+        else:
+            self.popularity = np.zeros(len(self.rows), dtype=np.float32)
+
+        self.tree_size = len(self.matrix)
+        self._tree = None
+        self._tree_lock = threading.Lock()
+        logging.info(f"✅ Song index built over {len(self.rows)} tracks.")
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def tree(self):
+        """KD-tree over the first ``tree_size`` tracks, built on first use."""
+        if self._tree is None and self.tree_size:
+            with self._tree_lock:
+                if self._tree is None:
+                    self._tree = self._build_tree()
+        return self._tree
+
+    @timed("model.SongIndex.build_tree")
+    def _build_tree(self):
+        from sklearn.neighbors import KDTree
+
+        tree = KDTree(self.matrix[:self.tree_size])
+        logging.info(f"✅ KD-tree built over {self.tree_size} tracks.")
+        return tree
+
+    @property
+    def tree_memory_bytes(self):
+        """Bytes held by the KD-tree, 0 while no exact query has needed it."""
+        if self._tree is None:
+            return 0
+        return sum(array.nbytes for array in self._tree.get_arrays())
+
+    def _share(self, data, matrix):
+        if not SHARED_MEMORY or not len(matrix):
+            return matrix
+        key = f"{dataset_version(data)}-{self.features}-{self.weights}"
+        return share_array(f"muzikirec-{hashlib.sha1(key.encode()).hexdigest()[:16]}", matrix)
+
+    @timed("model.SongIndex.extend")
+    def extend(self, data):
+        """Index over ``data``, whose leading rows are the frame this index was built from.
+
+        Appended tracks are scaled like the indexed ones and kept beside the KD-tree.
+        The index is rebuilt instead when they fall outside the indexed feature range
+        or the untreed tracks grow past ``DELTA_REBUILD_FRACTION`` of the index.
+        """
+        start = len(self.slots)
+        values = data[self.features].iloc[start:].to_numpy(dtype=np.float32, na_value=np.nan)
+        valid = ~np.isnan(values).any(axis=1)
+        normalized = (values[valid] - self.low) / self.span
+        untreed = len(self.matrix) - self.tree_size + len(normalized)
+        if ((normalized < 0) | (normalized > 1)).any() or untreed > DELTA_REBUILD_FRACTION * len(self.matrix):
+            return SongIndex(data, features=self.features, weights=self.weights)
+
+        index = copy.copy(self)
+        index._tree_lock = threading.Lock()
+        index.rows = np.concatenate([self.rows, start + np.flatnonzero(valid)])
+        index.slots = np.concatenate([self.slots, np.full(len(values), -1, dtype=np.int64)])
+        index.slots[index.rows[len(self.rows):]] = np.arange(len(self.rows), len(index.rows))
+        index.matrix = index._share(data, np.concatenate([self.matrix, normalized * self.scale]).astype(np.float32))
+        popularity = np.zeros(len(normalized), dtype=np.float32)
+        if "popularity" in data.columns:
+            popularity = data["popularity"].iloc[start:].to_numpy(dtype=np.float32, na_value=0.0)[valid]
+            popularity = np.clip(popularity / self.popularity_max, 0.0, 1.0)
+        index.popularity = np.concatenate([self.popularity, popularity])
+        logging.info(f"✅ Song index extended with {len(normalized)} tracks ({untreed} outside the tree).")
+        return index
+
+    def _nearest_in_subset(self, points, slots, pool):
+        # Blocked scan for every point at once: keep the best `pool` slots of every block, then merge
+        best_slots, best_dist = [], []
+        for start in range(0, len(slots), BLOCK_SIZE):
+            block = slots[start:start + BLOCK_SIZE]
+            dist = np.sqrt(((self.matrix[block][np.newaxis, :, :] - points[:, np.newaxis, :]) ** 2).sum(axis=2))
+            block = np.broadcast_to(block, dist.shape)
+            if dist.shape[1] > pool:
+                keep = np.argpartition(dist, pool - 1, axis=1)[:, :pool]
+                block, dist = np.take_along_axis(block, keep, axis=1), np.take_along_axis(dist, keep, axis=1)
+            best_slots.append(block)
+            best_dist.append(dist)
+
+        slots, dist = np.concatenate(best_slots, axis=1), np.concatenate(best_dist, axis=1)
+        order = np.argsort(dist, axis=1, kind="stable")[:, :pool]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(slots, order, axis=1)
+
+    def _nearest(self, points, pool, candidates=None):
+        # Top-`pool` (distances, slots) per point, sorted, over every track or only `candidates`
+        if candidates is None:
+            dist, slots = self.tree.query(points, k=min(pool, self.tree_size))
+            if len(self.matrix) == self.tree_size:
+                return dist.astype(np.float32), slots
+            # Appended tracks are not in the tree yet: scan them and merge the two rankings
+            appended = np.arange(self.tree_size, len(self.matrix))
+            extra_dist, extra_slots = self._nearest_in_subset(points, appended, min(pool, len(appended)))
+            dist = np.concatenate([dist.astype(np.float32), extra_dist], axis=1)
+            slots = np.concatenate([slots, extra_slots], axis=1)
+            order = np.argsort(dist, axis=1, kind="stable")[:, :pool]
+            return np.take_along_axis(dist, order, axis=1), np.take_along_axis(slots, order, axis=1)
+        slots = self.slots[np.asarray(candidates, dtype=np.int64)]
+        slots = slots[slots >= 0]
+        if len(slots) == 0:
+            return np.empty((len(points), 0), dtype=np.float32), np.empty((len(points), 0), dtype=np.int64)
+        return self._nearest_in_subset(points, slots, min(pool, len(slots)))
+
+    def scan(self, points, pool, chunk_size=16):
+        """Exact top-``pool`` ``(distances, slots)`` per point by a full scan, without the KD-tree."""
+        slots = np.arange(len(self.matrix))
+        pool = min(pool, len(slots))
+        results = [self._nearest_in_subset(points[start:start + chunk_size], slots, pool)
+                   for start in range(0, len(points), chunk_size)]
+        return np.concatenate([dist for dist, _ in results]), np.concatenate([found for _, found in results])
+
+    @timed("model.SongIndex.query")
+    def query(self, position, k=10, candidates=None, popularity_weight=0.0):
+        """Return ``(positions, distances, scores)`` of the k tracks closest to ``position``.
+
+        ``candidates`` restricts the search to a subset of row positions.
+        ``popularity_weight`` in [0, 1] blends normalized popularity into the score.
+        """
+        empty = np.array([], dtype=np.int64), np.array([], dtype=np.float32), np.array([], dtype=np.float32)
+        slot = self.slots[position]
+        if slot < 0 or not self.tree_size:
+            return empty
+
+        point = self.matrix[slot]
+        # Blending can promote tracks outside the k nearest, so rank a wider pool
+        pool = k + 1 if popularity_weight <= 0 else max(10 * k, k + 1)
+
+        dist, slots = self._nearest(point[np.newaxis, :], pool, candidates)
+        dist, slots = dist[0], slots[0]
+        if len(slots) == 0:
+            return empty
+
+        keep = slots != slot
+        dist, slots = dist[keep], slots[keep]
+        dist, slots, scores = self._score(dist, slots, popularity_weight)
+        return self.rows[slots], dist, scores
+
+    def _score(self, dist, slots, popularity_weight, *extra, rerank=True):
+        # Similarity from distance, optionally blended with popularity and re-ranked
+        scores = 1.0 - dist / self.max_distance
+        if popularity_weight > 0:
+            scores = (1.0 - popularity_weight) * scores + popularity_weight * self.popularity[slots]
+        if popularity_weight > 0 and rerank:
+            order = np.argsort(-scores, kind="stable")
+            dist, slots, scores = dist[order], slots[order], scores[order]
+            extra = tuple(values[order] for values in extra)
+        return (dist, slots, scores.astype(np.float32), *extra)
+
+    @timed("model.SongIndex.query_seeds")
+    def query_seeds(self, positions, k=10, strategy="centroid", candidates=None, popularity_weight=0.0):
+        """Rank tracks against several seeds at once.
+
+        ``strategy`` is "centroid" (distance to the seeds' mean), "max" (distance to the
+        closest seed) or "quota" (each seed's nearest tracks, interleaved round-robin).
+        Returns ``(positions, distances, scores, seed)`` where ``seed`` indexes ``positions``
+        of the seed each track is closest to.
+        """
+        empty = (np.array([], dtype=np.int64), np.array([], dtype=np.float32),
+                 np.array([], dtype=np.float32), np.array([], dtype=np.int64))
+        seed_slots = self.slots[np.asarray(positions, dtype=np.int64)]
+        if not self.tree_size or (seed_slots < 0).all():
+            return empty
+        points = self.matrix[seed_slots[seed_slots >= 0]]
+        pool = k + len(seed_slots) if popularity_weight <= 0 else max(10 * k, k + len(seed_slots))
+
+        if strategy == "centroid":
+            dist, slots = self._nearest(points.mean(axis=0, keepdims=True), pool, candidates)
+            dist, slots = dist[0], slots[0]
+        else:
+            dist, slots = self._nearest(points, pool, candidates)
+            if strategy == "quota":
+                if popularity_weight > 0:
+                    # Blend popularity within each seed's own list, so no seed's popular tracks take over the top
+                    scores = self._score(dist, slots, popularity_weight, rerank=False)[2]
+                    order = np.argsort(-scores, axis=1, kind="stable")
+                    dist, slots = np.take_along_axis(dist, order, axis=1), np.take_along_axis(slots, order, axis=1)
+                # Rank-major order takes every seed's best track before anyone's second best
+                dist, slots = dist.T.ravel(), slots.T.ravel()
+                first = np.sort(np.unique(slots, return_index=True)[1])
+                dist, slots = dist[first], slots[first]
+            else:
+                slots = np.unique(slots)
+                dist = np.sqrt(((self.matrix[slots][:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2))
+                dist = dist.min(axis=1)
+                order = np.argsort(dist, kind="stable")[:pool]
+                dist, slots = dist[order], slots[order]
+
+        keep = ~np.isin(slots, seed_slots)
+        dist, slots = dist[keep], slots[keep]
+        if len(slots) == 0:
+            return empty
+
+        # Attribute every track to its closest seed
+        to_seeds = ((self.matrix[slots][:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2)
+        seed = np.flatnonzero(seed_slots >= 0)[to_seeds.argmin(axis=1)]
+        # Quota order is already final; re-ranking by score would let one seed take every slot again
+        dist, slots, scores, seed = self._score(dist.astype(np.float32), slots, popularity_weight, seed,
+                                                rerank=strategy != "quota")
+        return self.rows[slots], dist, scores, seed
+
+# Read-only copy of `array` in a named shared-memory segment: the first process fills it, later ones attach
+def share_array(name, array):
+    from multiprocessing import resource_tracker, shared_memory
+
+    if name in _shared_segments:
+        segment = _shared_segments[name][0]
+    else:
+        try:
+            segment = shared_memory.SharedMemory(name=name, create=True, size=SHARED_HEADER_BYTES + array.nbytes)
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=SHARED_HEADER_BYTES)
+            shared[:] = array
+            segment.buf[0] = 1
+            _shared_segments[name] = (segment, os.getpid())
+            logging.info(f"✅ Shared {array.nbytes / 2 ** 20:.1f} MB feature matrix as {name}.")
+        except FileExistsError:
+            segment = shared_memory.SharedMemory(name=name)
+            # Only the creating process unlinks the segment; attached ones just unmap it on exit
+            resource_tracker.unregister(segment._name, "shared_memory")
+            deadline = time.monotonic() + SHARED_MEMORY_WAIT
+            while segment.buf[0] != 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if segment.buf[0] != 1 or segment.size < SHARED_HEADER_BYTES + array.nbytes:
+                logging.warning(f"⚠️ Shared segment {name} is not usable; keeping a private copy.")
+                segment.close()
+                return array
+            _shared_segments[name] = (segment, None)
+            logging.info(f"✅ Attached to shared feature matrix {name}.")
+
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=SHARED_HEADER_BYTES)
+    shared.flags.writeable = False
+    return shared
+
+# Unlink the segments this process created (forked children inherit the handler, but not the ownership)
+@atexit.register
+def _release_shared_segments():
+    for segment, creator in _shared_segments.values():
+        if creator == os.getpid():
+            segment.unlink()
+
+# Build (or reuse) the feature index for a dataset
+def get_song_index(data, features=None, weights=None):
+    key = (id(data), tuple(features or SOUND_FEATURES), None if weights is None else tuple(weights))
+    with _index_lock:
+        entry = _index_cache.get(key)
+        record_cache("song_index", entry is not None and entry[0] is data)
+        if entry is not None and entry[0] is data:
+            _index_cache.move_to_end(key)
+            return entry[1]
+
+        index = SongIndex(data, features=features, weights=weights)
+        _index_cache[key] = (data, index)
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+        return index
+
+# Feature indexes for `data`, whose leading rows are `previous`, extended from those built for `previous`
+def extend_song_index(previous, data):
+    with _index_lock:
+        for key, (indexed, index) in list(_index_cache.items()):
+            if indexed is previous:
+                _index_cache[(id(data), *key[1:])] = (data, index.extend(data))
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return get_song_index(data)
+
+# Drop the feature indexes and neighbour table of a frame the dataset store let go of
+@on_dataset_evicted
+def _release_indexes(name, data):
+    with _index_lock:
+        for key in [key for key, (indexed, _) in _index_cache.items() if indexed is data]:
+            del _index_cache[key]
+    version = dataset_version(data)
+    with _neighbours_lock:
+        for key in [key for key in _neighbours if key[0] == version]:
+            del _neighbours[key]
+
+# Row positions matching a title, narrowed by artist and year when given
+@timed("model.find_song_positions")
+def find_song_positions(song_name, data, artist=None, year=None):
+    positions = get_name_index(data).search(song_name)
+    if artist and "artists" in data.columns and len(positions):
+        artists = normalize_names(data["artists"].iloc[positions])
+        matches = artists.str.contains(str(artist).strip().lower(), regex=False)
+        positions = positions[matches.to_numpy(dtype=bool, na_value=False)]
+    if year is not None and "year" in data.columns and len(positions):
+        positions = positions[(data["year"].iloc[positions] == year).to_numpy()]
+    return positions
+
+# Precomputed neighbour table for a dataset, or None when missing or built for another version
+def load_neighbours(data, path=NEIGHBOURS_PATH):
+    if not os.path.exists(path):
+        return None
+    version = dataset_version(data)
+    key = (version, path, os.path.getmtime(path))
+    with _neighbours_lock:
+        record_cache("neighbour_table", key in _neighbours)
+        if key in _neighbours:
+            return _neighbours[key]
+        table = None
+        try:
+            with np.load(path) as saved:
+                if str(saved["version"]) == version:
+                    table = {name: saved[name] for name in ("rows", "neighbours", "scores")}
+                    table["max_distance"] = float(saved["max_distance"])
+                    table["slots"] = np.full(len(data), -1, dtype=np.int64)
+                    table["slots"][table["rows"]] = np.arange(len(table["rows"]))
+                    logging.info(f"✅ Serving recommendations from {path}.")
+                else:
+                    logging.info(f"Ignoring {path}: built for another dataset version.")
+        except Exception as e:
+            logging.warning(f"⚠️ Could not read neighbour table {path}: {e}")
+        _neighbours.clear()
+        _neighbours[key] = table
+        return table
 
 # Search helper
-def search_song(song_name, data):
+def search_song(song_name, data, artist=None, year=None):
     if "name" not in data.columns:
         st.warning("⚠️ 'name' column not found in dataset.")
         return pd.DataFrame()
-    return data[data["name"].str.contains(song_name, case=False, na=False)]
+    return data.iloc[find_song_positions(song_name, data, artist=artist, year=year)]
+
+# Pick one track among several sharing the best-matching title
+def resolve_seed(positions, data):
+    names = normalize_names(data["name"].iloc[positions]).to_numpy()
+    versions = positions[names == names[0]]
+    if len(versions) == 1:
+        return versions[0]
+
+    if "popularity" in data.columns:
+        position = versions[np.argmax(data["popularity"].iloc[versions].to_numpy())]
+    else:
+        position = versions[0]
+    artist = data["artists"].iat[position] if "artists" in data.columns else "unknown artist"
+    year = data["year"].iat[position] if "year" in data.columns else "unknown year"
+    st.info(f"{len(versions)} tracks share the title '{data['name'].iat[position]}'. "
+            f"Using the most popular one by {artist} ({year}); pick an artist or year to choose another.")
+    return position
 
 # Recommendation logic
-def recommend_songs(song_name, data, num_recommendations=10):
-    song = search_song(song_name, data)
-    if song.empty:
-        st.error(f"Song '{song_name}' not found. Try a different title.")
+@timed("model.recommend_songs")
+def recommend_songs(song_name, data, num_recommendations=10, popularity_weight=0.0,
+                    features=None, weights=None, candidates=None, artist=None, year=None, position=None):
+    if "name" not in data.columns:
+        st.warning("⚠️ 'name' column not found in dataset.")
         return pd.DataFrame()
 
-    features = song.iloc[0][["valence", "energy", "danceability", "acousticness"]]
-    if features.isnull().any():
+    # A row position picked by the caller is used as is; titles are matched and disambiguated
+    if position is None:
+        positions = find_song_positions(song_name, data, artist=artist, year=year)
+        if len(positions) == 0:
+            st.error(f"Song '{song_name}' not found. Try a different title.")
+            return pd.DataFrame()
+        position = resolve_seed(positions, data)
+    song = data.iloc[[position]]
+
+    features = list(features or SOUND_FEATURES)
+    if song.iloc[0][features].isnull().any():
         st.error("Selected song is missing sound features needed for recommendation.")
         return pd.DataFrame()
 
-    recommended = data.copy()
-    for feature in features.index:
-        if feature in recommended.columns:
-            recommended = recommended[
-                recommended[feature].between(features[feature] - 0.1, features[feature] + 0.1)
-            ]
-    return recommended.drop_duplicates().nlargest(num_recommendations, "popularity")
\ No newline at end of file
+    # Plain nearest-neighbour queries are served from the precomputed table when there is one
+    default_query = candidates is None and popularity_weight <= 0 and weights is None and features == SOUND_FEATURES
+    table = load_neighbours(data) if default_query else None
+    ivf = load_ivf_index(data) if default_query and table is None else None
+    slot = table["slots"][position] if table is not None else -1
+    if slot >= 0 and table["neighbours"].shape[1] >= 2 * num_recommendations:
+        positions = table["neighbours"][slot]
+        scores = table["scores"][slot].astype(np.float32)
+        distances = (1.0 - scores) * table["max_distance"]
+        count("recommendations", source="precomputed")
+    elif ivf is not None:
+        # Approximate search over the closest inverted lists only
+        positions, distances, scores = ivf.query(position, k=2 * num_recommendations, nprobe=DEFAULT_NPROBE)
+        count("recommendations", source="ivf")
+    else:
+        count("recommendations", source="index")
+        index = get_song_index(data, features=features, weights=weights)
+        # Over-fetch so dropping duplicates of the seed still leaves enough tracks
+        positions, distances, scores = index.query(
+            position, k=2 * num_recommendations, candidates=candidates, popularity_weight=popularity_weight
+        )
+
+    recommended = data.iloc[positions].assign(distance=distances, similarity=scores)
+    dedupe_cols = [col for col in ("name", "artists") if col in recommended.columns]
+    if dedupe_cols:
+        seed = song.iloc[0][dedupe_cols]
+        is_seed = (recommended[dedupe_cols] == seed.values).all(axis=1)
+        recommended = recommended[~is_seed].drop_duplicates(subset=dedupe_cols)
+    return recommended.head(num_recommendations)
+
+# Greedy maximal-marginal-relevance order: trade relevance against similarity to tracks already picked
+def diversify(vectors, scores, k, diversity, max_distance=1.0):
+    chosen = []
+    closest = np.zeros(len(scores), dtype=np.float32)
+    available = np.ones(len(scores), dtype=bool)
+    for _ in range(min(k, len(scores))):
+        gain = np.where(available, (1.0 - diversity) * scores - diversity * closest, -np.inf)
+        pick = int(np.argmax(gain))
+        chosen.append(pick)
+        available[pick] = False
+        similarity = 1.0 - np.sqrt(((vectors - vectors[pick]) ** 2).sum(axis=1)) / max_distance
+        closest = np.maximum(closest, similarity)
+    return np.asarray(chosen, dtype=np.int64)
+
+# Row positions of seed tracks given as row positions, titles, or (title, artist, year) tuples
+def resolve_seed_positions(seeds, data):
+    positions = []
+    for seed in seeds:
+        if isinstance(seed, (int, np.integer)):
+            if 0 <= seed < len(data):
+                positions.append(int(seed))
+            continue
+        title, artist, year = seed if isinstance(seed, tuple) else (seed, None, None)
+        matches = find_song_positions(title, data, artist=artist, year=year)
+        if len(matches):
+            positions.append(int(resolve_seed(matches, data)))
+        else:
+            st.warning(f"Seed song '{title}' not found; skipping it.")
+    return list(dict.fromkeys(positions))
+
+# Playlist continuation: recommendations for several seed tracks scored in one batch
+@timed("model.recommend_for_seeds")
+def recommend_for_seeds(seeds, data, num_recommendations=10, strategy="centroid", diversity=0.2,
+                        max_per_artist=2, popularity_weight=0.0, features=None, weights=None, candidates=None):
+    if strategy not in SEED_STRATEGIES:
+        raise ValueError(f"Unknown seed strategy '{strategy}'. Use one of {SEED_STRATEGIES}.")
+
+    positions = resolve_seed_positions(seeds, data)
+    features = list(features or SOUND_FEATURES)
+    positions = [pos for pos in positions if not data[features].iloc[pos].isnull().any()]
+    if not positions:
+        st.error("None of the seed songs can be used for recommendations.")
+        return pd.DataFrame()
+
+    index = get_song_index(data, features=features, weights=weights)
+    found, distances, scores, seed = index.query_seeds(
+        positions, k=SEED_POOL_FACTOR * num_recommendations, strategy=strategy,
+        candidates=candidates, popularity_weight=popularity_weight
+    )
+    if len(found) == 0:
+        return pd.DataFrame()
+
+    # Drop other versions of the seeds, duplicates of each other, and flooding by one artist
+    recommended = data.iloc[found]
+    keep = np.ones(len(found), dtype=bool)
+    dedupe_cols = [col for col in ("name", "artists") if col in data.columns]
+    if dedupe_cols:
+        keys = pd.MultiIndex.from_frame(recommended[dedupe_cols].astype(str))
+        seed_keys = pd.MultiIndex.from_frame(data.iloc[positions][dedupe_cols].astype(str))
+        keep &= ~keys.isin(seed_keys) & ~keys.duplicated()
+    if max_per_artist and "artists" in data.columns:
+        artists = recommended["artists"].astype(str).where(keep)
+        keep &= (artists.groupby(artists.to_numpy()).cumcount() < max_per_artist).to_numpy()
+    found, distances, scores, seed = found[keep], distances[keep], scores[keep], seed[keep]
+
+    # Quotas already spread picks across seeds; the other strategies are diversified by MMR
+    if strategy != "quota" and diversity > 0:
+        order = diversify(index.matrix[index.slots[found]], scores, num_recommendations, diversity, index.max_distance)
+    else:
+        order = np.arange(min(num_recommendations, len(found)))
+    found, distances, scores, seed = found[order], distances[order], scores[order], seed[order]
+
+    seed_names = data["name"].iloc[positions].to_numpy() if "name" in data.columns else np.asarray(positions)
+    return data.iloc[found].assign(distance=distances, similarity=scores, seed=seed_names[seed])
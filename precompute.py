@@ -0,0 +1,170 @@
+"""Offline top-N neighbour precompute for the recommendation page.
+
+Usage: python precompute.py [--top-n 50] [--workers 4] [--block-size 256] [--worker-memory-mb 256]
+
+Scores every track against the whole catalog in blocks on a process pool and
+writes int32 neighbour row ids with float16 similarity scores. While the file
+matches the loaded dataset, ``model.recommend_songs`` answers plain queries by
+direct lookup instead of searching the feature index.
+
+Each worker scores one tile of query rows x catalog rows at a time. A tile peaks
+at about 20 bytes per cell: the float32 distances, argpartition's float32 working
+copy and its int64 order. The column block is sized so a tile fits ``--worker-memory-mb``; with the defaults a
+worker peaks at about 256 MB plus 4 bytes per catalog track for the norms (the
+feature matrix itself is memory-mapped and shared). The default worker count is
+capped so all workers fit in the memory available.
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Neighbours stored per track
+TOP_N = 50
+
+# Query rows scored per task
+BLOCK_SIZE = 256
+
+# Memory (MB) one worker may use for its distance tile; sets the catalog rows compared per matrix product
+WORKER_MEMORY_MB = float(os.getenv("MUZIKIREC_PRECOMPUTE_WORKER_MB", "256"))
+
+# Peak bytes per tile cell (measured): the float32 distances, argpartition's float32 working copy
+# and its int64 order
+TILE_BYTES_PER_CELL = 20
+
+# Per-worker feature matrix, memory-mapped once by the pool initializer
+_matrix = None
+_norms = None
+
+# Load the shared feature matrix in each worker
+def _init_worker(matrix_path):
+    global _matrix, _norms
+    _matrix = np.load(matrix_path, mmap_mode="r")
+    _norms = np.einsum("ij,ij->i", _matrix, _matrix)
+
+# Catalog rows per tile, so a tile of `block_size` query rows fits the per-worker memory budget
+def column_block_size(block_size, worker_memory_mb=WORKER_MEMORY_MB):
+    cells = worker_memory_mb * 2 ** 20 / TILE_BYTES_PER_CELL
+    return max(1024, int(cells // max(block_size, 1)))
+
+# Worker processes that fit the available memory, at most one per CPU
+def default_workers(worker_memory_mb=WORKER_MEMORY_MB):
+    cpus = os.cpu_count() or 1
+    try:
+        available_mb = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (AttributeError, ValueError, OSError):
+        return cpus
+    return max(1, min(cpus, int(available_mb // worker_memory_mb)))
+
+# Top-n of several candidate (distances, slots) sets per row
+def _keep_best(dist, slots, top_n):
+    if dist.shape[1] <= top_n:
+        return dist, slots
+    keep = np.argpartition(dist, top_n - 1, axis=1)[:, :top_n]
+    return np.take_along_axis(dist, keep, axis=1), np.take_along_axis(slots, keep, axis=1)
+
+# Top-n neighbour slots and squared distances for one block of query rows
+def _score_block(task):
+    start, stop, top_n, column_block = task
+    queries = np.asarray(_matrix[start:stop])
+    query_norms = _norms[start:stop]
+    rows = np.arange(start, stop)
+
+    best_slots = np.empty((len(queries), 0), dtype=np.int64)
+    best_dist = np.empty((len(queries), 0), dtype=np.float32)
+    for col_start in range(0, len(_matrix), column_block):
+        block = np.asarray(_matrix[col_start:col_start + column_block])
+        # |q - x|^2 = |q|^2 + |x|^2 - 2 q.x, built in place so the tile is the only full-size array
+        dist = queries @ block.T
+        dist *= -2.0
+        dist += query_norms[:, np.newaxis]
+        dist += _norms[col_start:col_start + len(block)]
+        np.maximum(dist, 0.0, out=dist)
+
+        # A track is never its own neighbour
+        own = (rows >= col_start) & (rows < col_start + len(block))
+        dist[own, rows[own] - col_start] = np.inf
+
+        # Reduce the tile to its top-n columns first; slots are only materialized for those
+        if dist.shape[1] > top_n:
+            keep = np.argpartition(dist, top_n - 1, axis=1)[:, :top_n]
+            dist = np.take_along_axis(dist, keep, axis=1)
+        else:
+            keep = np.broadcast_to(np.arange(len(block)), dist.shape)
+        best_dist, best_slots = _keep_best(np.concatenate([best_dist, dist], axis=1),
+                                           np.concatenate([best_slots, col_start + keep], axis=1), top_n)
+
+    order = np.argsort(best_dist, axis=1, kind="stable")
+    return start, np.take_along_axis(best_slots, order, axis=1), np.take_along_axis(best_dist, order, axis=1)
+
+# Exact top-n neighbours for every indexed track
+def compute_neighbours(index, top_n=TOP_N, workers=None, block_size=BLOCK_SIZE, worker_memory_mb=WORKER_MEMORY_MB):
+    count = len(index)
+    top_n = max(1, min(top_n, count - 1))
+    neighbours = np.empty((count, top_n), dtype=np.int32)
+    scores = np.empty((count, top_n), dtype=np.float16)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        matrix_path = os.path.join(tmp_dir, "matrix.npy")
+        np.save(matrix_path, index.matrix)
+        column_block = column_block_size(block_size, worker_memory_mb)
+        workers = workers or default_workers(worker_memory_mb)
+        logging.info(f"Scoring {block_size}x{column_block} tiles on {workers} workers "
+                     f"(~{worker_memory_mb:g} MB each).")
+        tasks = [(start, min(start + block_size, count), top_n, column_block) for start in range(0, count, block_size)]
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix_path,)) as pool:
+            for done, (start, slots, dist) in enumerate(pool.map(_score_block, tasks), start=1):
+                stop = start + len(slots)
+                neighbours[start:stop] = index.rows[slots]
+                scores[start:stop] = 1.0 - np.sqrt(dist) / index.max_distance
+                logging.info(f"Scored {stop}/{count} tracks ({done}/{len(tasks)} blocks).")
+
+    return neighbours, scores
+
+# Compute and save the neighbour table for the current catalog
+def main():
+    # Imported here so the pool workers do not load the app stack
+    from loading import import_data, dataset_version
+    from model import NEIGHBOURS_PATH, get_song_index
+
+    parser = argparse.ArgumentParser(description="Precompute top-N song neighbours for MuzikiRec.")
+    parser.add_argument("--top-n", type=int, default=TOP_N, help="neighbours stored per track")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: one per CPU, capped by available memory)")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="query rows per task")
+    parser.add_argument("--worker-memory-mb", type=float, default=WORKER_MEMORY_MB,
+                        help="distance tile budget per worker, in MB")
+    parser.add_argument("--output", default=NEIGHBOURS_PATH, help="output .npz path")
+    args = parser.parse_args()
+
+    data = import_data()[0]
+    if data is None or data.empty:
+        logging.error("❌ No song data to precompute neighbours for.")
+        return 1
+
+    index = get_song_index(data)
+    if len(index) < 2:
+        logging.error("❌ Not enough tracks with sound features to precompute neighbours.")
+        return 1
+
+    started = time.perf_counter()
+    neighbours, scores = compute_neighbours(index, args.top_n, args.workers, args.block_size, args.worker_memory_mb)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    tmp_path = f"{args.output}.tmp.npz"
+    np.savez(tmp_path, version=dataset_version(data), rows=index.rows.astype(np.int32),
+             neighbours=neighbours, scores=scores, max_distance=index.max_distance)
+    os.replace(tmp_path, args.output)
+    logging.info(f"✅ Wrote {neighbours.shape[1]} neighbours for {len(neighbours)} tracks to {args.output} "
+                 f"in {time.perf_counter() - started:.1f}s.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,28 +1,235 @@
 import streamlit as st
+import ast
+import os
+import re
 import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from spotipy.exceptions import SpotifyException
 
-def create_spotify_playlist(spotify_client, user_id, playlist_name, song_names):
+from instrumentation import count, record_cache, timed
+from loading import CACHE_DIR
+
+# Concurrent track searches per playlist
+MAX_WORKERS = 8
+
+# Spotify accepts at most 100 tracks per playlist_add_items call
+PLAYLIST_CHUNK_SIZE = 100
+
+# Attempts per API call before giving up on rate limits and server errors
+MAX_ATTEMPTS = 5
+
+# Base delay of the exponential backoff when no Retry-After header is sent
+BACKOFF_SECONDS = 1.0
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Spotify track IDs are 22 base62 characters
+TRACK_ID_PATTERN = re.compile(r"^[0-9A-Za-z]{22}$")
+
+# Local name + artist -> URI cache for tracks that still need a search
+URI_CACHE_PATH = os.path.join(CACHE_DIR, "spotify_uris.sqlite")
+URI_CACHE_TTL_SECONDS = 30 * 24 * 3600
+URI_CACHE_MAX_ENTRIES = 50000
+
+# SQLite-backed search result cache with TTL and least-recently-used eviction
+class TrackURICache:
+    """Remembers search results (including misses) per normalized name and artist."""
+
+    def __init__(self, path=URI_CACHE_PATH, ttl=URI_CACHE_TTL_SECONDS, max_entries=URI_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS uris ("
+                         "key TEXT PRIMARY KEY, uri TEXT, created REAL NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS uris_accessed ON uris (accessed)")
+
+    @contextmanager
+    def _connect(self):
+        # A sqlite3 connection's own context manager only commits or rolls back; closing releases the file
+        with closing(sqlite3.connect(self.path, timeout=10)) as conn, conn:
+            yield conn
+
+    @staticmethod
+    def key(name, artist=None):
+        return f"{str(name).strip().lower()}\x1f{str(artist or '').strip().lower()}"
+
+    def get(self, name, artist=None):
+        """Return ``(hit, uri)``; ``uri`` is None for a cached miss."""
+        key, now = self.key(name, artist), time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT uri, created FROM uris WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            if now - row[1] > self.ttl:
+                conn.execute("DELETE FROM uris WHERE key = ?", (key,))
+                return False, None
+            conn.execute("UPDATE uris SET accessed = ? WHERE key = ?", (now, key))
+            return True, row[0]
+
+    def put(self, name, artist, uri):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO uris (key, uri, created, accessed) VALUES (?, ?, ?, ?)",
+                         (self.key(name, artist), uri, now, now))
+            conn.execute("DELETE FROM uris WHERE created < ?", (now - self.ttl,))
+            conn.execute("DELETE FROM uris WHERE key IN (SELECT key FROM uris ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                         (self.max_entries,))
+
+_uri_cache = None
+
+def get_uri_cache():
+    global _uri_cache
+    if _uri_cache is None:
+        _uri_cache = TrackURICache()
+    return _uri_cache
+
+# First artist of a catalog "artists" value such as "['adele', 'drake']"
+def primary_artist(artists):
+    if not artists:
+        return None
+    try:
+        parsed = ast.literal_eval(str(artists))
+    except (ValueError, SyntaxError):
+        return str(artists)
+    if isinstance(parsed, (list, tuple)):
+        return str(parsed[0]) if parsed else None
+    return str(parsed)
+
+# Spotify URI for a catalog track ID, or None when the ID is missing or malformed
+def track_uri(track_id):
+    if track_id and TRACK_ID_PATTERN.match(str(track_id)):
+        return f"spotify:track:{track_id}"
+    return None
+
+# Shared pause window, so one 429 slows down every worker instead of each finding out alone
+_pause_until = 0.0
+_pause_lock = threading.Lock()
+
+def _wait_for_rate_limit():
+    delay = _pause_until - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def _pause_all(seconds):
+    global _pause_until
+    with _pause_lock:
+        _pause_until = max(_pause_until, time.monotonic() + seconds)
+
+# Call a Spotify API method, honouring Retry-After on 429 and backing off on server errors
+def call_with_backoff(method, *args, **kwargs):
+    name = getattr(method, "__name__", "call")
+    for attempt in range(MAX_ATTEMPTS):
+        _wait_for_rate_limit()
+        count("spotify_calls", method=name)
+        try:
+            return method(*args, **kwargs)
+        except SpotifyException as e:
+            count("spotify_errors", method=name, status=e.http_status)
+            if e.http_status not in RETRYABLE_STATUSES or attempt == MAX_ATTEMPTS - 1:
+                raise
+            count("spotify_retries", method=name, status=e.http_status)
+            retry_after = (e.headers or {}).get("Retry-After")
+            if retry_after is not None and str(retry_after).isdigit():
+                delay = float(retry_after)
+            else:
+                delay = BACKOFF_SECONDS * 2 ** attempt + random.uniform(0, BACKOFF_SECONDS)
+            if e.http_status == 429:
+                _pause_all(delay)
+            logging.warning(f"Spotify returned {e.http_status}; retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+# Search one song and report its resolve status
+def resolve_track(spotify_client, name, artist=None, cache=None):
+    query = f"track:{name} artist:{artist}" if artist else f"track:{name}"
+    try:
+        results = call_with_backoff(spotify_client.search, q=query, type="track", limit=1)
+        items = results["tracks"]["items"]
+        uri = items[0]["uri"] if items else None
+        if cache is not None:
+            cache.put(name, artist, uri)
+        return {"song": name, "uri": uri, "status": "found" if uri else "not found"}
+    except Exception as e:
+        logging.error(f"Track search failed for '{name}': {e}")
+        return {"song": name, "uri": None, "status": "error", "error": str(e)}
+
+# Resolve tracks to URIs: catalog IDs first, then the local cache, then concurrent searches
+@timed("spotify_utils.resolve_tracks")
+def resolve_tracks(spotify_client, tracks, max_workers=MAX_WORKERS, cache=None):
+    tracks = [{"song": track} if isinstance(track, str) else track for track in tracks]
+    resolved, pending = [None] * len(tracks), []
+
+    for i, track in enumerate(tracks):
+        artist = primary_artist(track.get("artist"))
+        uri = track_uri(track.get("id"))
+        if uri:
+            resolved[i] = {"song": track["song"], "uri": uri, "status": "catalog id"}
+            continue
+        hit, uri = cache.get(track["song"], artist) if cache is not None else (False, None)
+        if cache is not None:
+            record_cache("spotify_uri", hit)
+        if hit:
+            resolved[i] = {"song": track["song"], "uri": uri, "status": "cached" if uri else "not found"}
+        else:
+            pending.append((i, track["song"], artist))
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            searched = pool.map(lambda item: resolve_track(spotify_client, item[1], item[2], cache), pending)
+            for (i, _, _), result in zip(pending, searched):
+                resolved[i] = result
+    logging.info(f"Resolved {len(tracks)} track(s) with {len(pending)} search call(s).")
+    return resolved
+
+# Add tracks in chunks of 100; returns the URIs that could not be added
+@timed("spotify_utils.add_tracks_in_chunks")
+def add_tracks_in_chunks(spotify_client, playlist_id, track_uris, chunk_size=PLAYLIST_CHUNK_SIZE):
+    failed = []
+    for start in range(0, len(track_uris), chunk_size):
+        chunk = track_uris[start:start + chunk_size]
+        try:
+            call_with_backoff(spotify_client.playlist_add_items, playlist_id, chunk)
+        except Exception as e:
+            logging.error(f"Adding tracks {start}-{start + len(chunk) - 1} failed: {e}")
+            failed.extend(chunk)
+    return failed
+
+# Create a playlist from catalog tracks ({"song", "artist", "id"} dicts) or plain song names
+@timed("spotify_utils.create_spotify_playlist")
+def create_spotify_playlist(spotify_client, user_id, playlist_name, song_names=None, tracks=None):
     try:
-        playlist = spotify_client.user_playlist_create(user=user_id, name=playlist_name)
+        playlist = call_with_backoff(spotify_client.user_playlist_create, user=user_id, name=playlist_name)
         playlist_id = playlist["id"]
         playlist_url = playlist["external_urls"]["spotify"]
-
-        track_uris = []
-        for name in song_names:
-            results = spotify_client.search(q=f"track:{name}", type="track", limit=1)
-            items = results["tracks"]["items"]
-            if items:
-                track_uris.append(items[0]["uri"])
-
-        if track_uris:
-            spotify_client.playlist_add_items(playlist_id, track_uris)
-
-        return {
-            "success": True,
-            "name": playlist_name,
-            "track_count": len(track_uris),
-            "url": playlist_url
-        }
     except Exception as e:
         logging.error(f"Playlist creation failed: {e}")
-        return {"success": False}
\ No newline at end of file
+        return {"success": False}
+
+    try:
+        cache = get_uri_cache()
+    except Exception as e:
+        logging.warning(f"⚠️ Spotify URI cache unavailable: {e}")
+        cache = None
+
+    resolved = resolve_tracks(spotify_client, tracks if tracks is not None else song_names or [], cache=cache)
+    track_uris = [track["uri"] for track in resolved if track["uri"]]
+    failed_uris = set(add_tracks_in_chunks(spotify_client, playlist_id, track_uris))
+    for track in resolved:
+        if track["uri"] in failed_uris:
+            track["status"] = "not added"
+
+    return {
+        "success": True,
+        "name": playlist_name,
+        "track_count": sum(bool(track["uri"]) and track["status"] != "not added" for track in resolved),
+        "url": playlist_url,
+        "tracks": resolved,
+        "failed": [track["song"] for track in resolved if not track["uri"] or track["status"] == "not added"]
+    }
@@ -0,0 +1,224 @@
+"""Incremental catalog updates: append new tracks without a cold rebuild.
+
+Usage: python updates.py new_tracks.csv [more.csv ...]
+
+New rows are validated and normalized like the catalog, then appended to
+``datasets/data.csv`` and to its compiled cache. The grown source is written to
+a temporary file that replaces ``data.csv`` only once the caches are written,
+all under a file lock, so concurrent or failed appends never leave the source
+and its caches out of step. In this process the new rows are also inserted
+into the warm name and feature indexes and assigned to the existing song
+clusters, and the new catalog is published to the dataset store. Other
+processes load the new version from the compiled cache and reuse the
+carried-over cluster results. Only a k whose centroids the new rows drifted
+away from is refitted, or every k when the new rows change the scaled features
+of existing rows (a wider feature range, or a new mean imputed for missing
+values). Rerun ``precompute.py`` or ``ann.py`` afterwards if you use them;
+tables built for the old version are ignored.
+"""
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from loading import (
+    CACHE_DIR, DATASET_PATHS, SCALED_SUFFIX, SOUND_FEATURES, STREAM_THRESHOLD_MB, append_rows,
+    convert_non_numeric_to_string, dataset_store, dataset_version, derive_columns, file_fingerprint, optimize_dtypes,
+    write_cached_dataset
+)
+from indexing import extend_name_index
+from model import extend_song_index
+from clustering import SONG_CLUSTER_RANGE, extend_cluster_sweep
+from instrumentation import timed
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+# Columns every new track must have
+REQUIRED_COLUMNS = ["name", *SOUND_FEATURES]
+
+# Oldest release year accepted for a new track
+MIN_YEAR = 1900
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are serialized within the process only
+    fcntl = None
+
+_append_lock = threading.Lock()
+
+# Hold an exclusive lock on a source file for a whole update, across threads and processes
+@contextmanager
+def source_lock(path):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    lock_path = os.path.join(CACHE_DIR, f"{os.path.basename(path)}.lock")
+    with _append_lock, open(lock_path, "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+# Split a batch into rows that can join the catalog and rejected rows with a reason each
+def validate_tracks(new_tracks, data):
+    missing = [col for col in REQUIRED_COLUMNS if col not in new_tracks.columns]
+    if missing:
+        raise ValueError(f"New tracks are missing required columns: {missing}")
+
+    tracks = new_tracks.reset_index(drop=True)
+    reasons = pd.Series("", index=tracks.index, dtype=object)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    reject(tracks["name"].isna() | (tracks["name"].astype(str).str.strip() == ""), "missing name")
+    # Sound features are Spotify audio features, always in [0, 1]
+    features = tracks[SOUND_FEATURES].apply(pd.to_numeric, errors="coerce")
+    reject(features.isna().any(axis=1), "missing sound features")
+    reject(((features < 0) | (features > 1)).any(axis=1), "sound feature outside [0, 1]")
+
+    if "year" in data.columns:
+        year = pd.to_numeric(tracks.get("year", pd.Series(np.nan, index=tracks.index)), errors="coerce")
+        reject(year.isna() | (year < MIN_YEAR) | (year > date.today().year + 1), "invalid year")
+
+    if "id" in data.columns and "id" in tracks.columns:
+        ids = tracks["id"].astype(str)
+        # Probe the catalog with the (small) batch rather than hashing every catalog id
+        known = data["id"][data["id"].isin(ids.unique())].astype(str)
+        reject(ids.isin(known), "id already in catalog")
+        reject(ids.duplicated(), "duplicate id in batch")
+
+    accepted = (reasons == "").to_numpy()
+    return tracks[accepted], tracks[~accepted].assign(reason=reasons[~accepted])
+
+# Bring accepted rows to the catalog's normalization: numeric columns parsed, strings lowercased
+def normalize_tracks(tracks, data):
+    rows = tracks.reindex(columns=[col for col in data.columns if col in tracks.columns]).copy()
+    for col in rows.columns:
+        if pd.api.types.is_numeric_dtype(data[col].dtype):
+            rows[col] = pd.to_numeric(rows[col], errors="coerce")
+    return convert_non_numeric_to_string(rows)
+
+# Append raw rows to a source CSV, in its column order
+def append_to_source(path, tracks):
+    header = pd.read_csv(path, nrows=0).columns
+    ignored = [col for col in tracks.columns if col not in header]
+    if ignored:
+        logging.warning(f"⚠️ Columns not in {path} are not stored: {ignored}")
+
+    with open(path, "rb+") as handle:
+        handle.seek(0, os.SEEK_END)
+        if handle.tell() > 0:
+            handle.seek(-1, os.SEEK_END)
+            if handle.read(1) != b"\n":
+                handle.write(b"\n")
+    tracks.reindex(columns=header).to_csv(path, mode="a", header=False, index=False)
+
+# Whether the appended rows changed the scaled features of existing rows: a wider
+# min-max range, or a new imputation mean for rows with missing sound features
+def rescales_existing_rows(previous, derived):
+    scaled = [col for col in derived.columns if col.endswith(SCALED_SUFFIX) and col in previous.columns]
+    old = previous[scaled].to_numpy(dtype=np.float32)
+    return not np.array_equal(old, derived[scaled].iloc[:len(previous)].to_numpy(dtype=np.float32))
+
+# Copy of a source file with raw rows appended, written beside it for os.replace
+def grown_source(path, tracks):
+    tmp_path = f"{path}.tmp"
+    shutil.copyfile(path, tmp_path)
+    try:
+        append_to_source(tmp_path, tracks)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+# Append new tracks to the catalog and update everything derived from it in place
+@timed("updates.append_tracks")
+def append_tracks(new_tracks, path=DATASET_PATHS["Data"]):
+    """Validate ``new_tracks`` and add the accepted ones to the catalog.
+
+    Returns a report with the appended and rejected counts, the rejected rows
+    (with a ``reason`` column), and the song cluster k that are being refitted.
+    The source file is replaced only after its compiled caches are written; if
+    anything fails before that, the catalog on disk is left as it was.
+    """
+    with source_lock(path):
+        return _append_tracks(new_tracks, path)
+
+def _append_tracks(new_tracks, path):
+    # Read under the lock, so an append from another process is picked up and chained onto
+    store = dataset_store()
+    previous = store.get("Data")
+    if previous is None:
+        raise ValueError(f"No catalog loaded from {path}; nothing to append to.")
+
+    tracks, rejected = validate_tracks(new_tracks, previous)
+    report = {"appended": len(tracks), "rejected": rejected, "refit": [], "reingested": False}
+    for reason, count in rejected["reason"].value_counts().items():
+        logging.warning(f"⚠️ Rejected {count} new tracks: {reason}.")
+    if tracks.empty:
+        return report
+
+    tmp_path = grown_source(path, tracks)
+    try:
+        if os.path.getsize(tmp_path) >= STREAM_THRESHOLD_MB * 2 ** 20:
+            # Streamed catalogs live in an on-disk matrix; the store re-ingests the grown file on next use
+            os.replace(tmp_path, path)
+            report["reingested"] = True
+            logging.info(f"✅ Appended {len(tracks)} tracks to {path}; the streamed catalog is rebuilt on next load.")
+            return report
+
+        fingerprint = file_fingerprint(tmp_path)
+        rows = normalize_tracks(tracks, previous)
+        data = append_rows(previous, rows)
+
+        # Derived columns are vectorized and cheap; recomputing them keeps the caches identical to a cold load.
+        # When that moves existing rows, their carried-over cluster labels are stale, so every k is refitted.
+        derived = optimize_dtypes(derive_columns(data))
+        rescaled = rescales_existing_rows(previous, derived)
+        write_cached_dataset(data.drop(columns=derived.columns, errors="ignore"), path, fingerprint)
+        write_cached_dataset(derived, path, fingerprint, kind="derived")
+        for col in derived.columns:
+            data[col] = derived[col]
+        dataset_version(data, fingerprint)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    extend_name_index(previous, data)
+    extend_song_index(previous, data)
+    _, report["refit"] = extend_cluster_sweep(previous, data, SONG_CLUSTER_RANGE, "songs", rescaled=rescaled)
+    store.put("Data", data)
+    logging.info(f"✅ Appended {len(tracks)} tracks; the catalog now has {len(data)}.")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new tracks to the MuzikiRec catalog.")
+    parser.add_argument("files", nargs="+", help="CSV files of new tracks, with the columns of data.csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        new_tracks = pd.concat([pd.read_csv(file) for file in args.files], ignore_index=True)
+        report = append_tracks(new_tracks)
+    except (OSError, ValueError) as e:
+        logging.error(f"❌ Could not append tracks: {e}")
+        return 1
+
+    print(f"Appended: {report['appended']} tracks in {time.perf_counter() - started:.1f}s")
+    print(f"Rejected: {len(report['rejected'])}")
+    if report["refit"]:
+        print(f"Refitting song clusters for k={report['refit']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())